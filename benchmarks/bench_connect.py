@@ -0,0 +1,93 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import paramiko
+
+from zyxelprometheus import login, logout
+
+USER = "admin"
+PASSWD = "benchpassword"
+
+
+class RouterServer(paramiko.ServerInterface):
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (USER, PASSWD):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+
+def serve(listener, host_key):
+    while True:
+        try:
+            sock, _ = listener.accept()
+        except OSError:
+            return
+        transport = paramiko.Transport(sock)
+        transport.add_server_key(host_key)
+        try:
+            transport.start_server(server=RouterServer())
+        except (paramiko.SSHException, EOFError):
+            transport.close()
+
+
+def bench(port, iterations, **options):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        session = login("127.0.0.1", USER, PASSWD, port=port, **options)
+        logout(session)
+    return (time.perf_counter() - start) / iterations
+
+
+def main(argv):
+    iterations = int(argv[0]) if len(argv) > 0 else 20
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(16)
+    port = listener.getsockname()[1]
+    threading.Thread(target=serve,
+                     args=(listener, paramiko.RSAKey.generate(2048)),
+                     daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        known_hosts = os.path.join(tmpdir, "known_hosts")
+        cases = [
+            ("defaults", {}),
+            ("compression", {"compress": True}),
+            ("aes128-ctr", {"ciphers": ["aes128-ctr"]}),
+            ("curve25519", {"kex": ["curve25519-sha256@libssh.org"]}),
+            ("ecdh-nistp256", {"kex": ["ecdh-sha2-nistp256"]}),
+            ("known hosts", {"known_hosts": known_hosts}),
+        ]
+        for name, options in cases:
+            taken = bench(port, iterations, **options)
+            print(f"{name + ':':15} {taken * 1000:.2f} ms per connect")
+
+    listener.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,84 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import re
+import sys
+import time
+
+from zyxelprometheus import prometheus
+
+from .synthetic import ifconfig
+
+iface_re = re.compile(r"^([\w.]+)\s+(.*?)^$", re.MULTILINE | re.DOTALL)
+
+legacy_iface_stats_map = [
+    ("zyxel_bytes", "Bytes sent/received.",
+     re.compile(r"(RX|TX) bytes:(\d+)")),
+    ("zyxel_packets", "Bytes sent/received.",
+     re.compile(r"(RX|TX) packets:(\d+)")),
+    ("zyxel_errors", "Bytes sent/received.",
+     re.compile(r"(RX|TX).*errors:(\d+)")),
+    ("zyxel_dropped", "Bytes sent/received.",
+     re.compile(r"(RX|TX).*dropped:(\d+)")),
+]
+
+
+def legacy_prometheus(ifconfig):
+    # The original regular expression per metric implementation, kept for
+    # comparison.
+    output = []
+    for (metric, help, metric_re) in legacy_iface_stats_map:
+        output.append(f"# HELP {metric} {help}")
+        output.append(f"# TYPE {metric} counter")
+        for iface in iface_re.finditer(ifconfig.replace("\r\n", "\n")):
+            iface_name = iface.group(1)
+            iface_stats = iface.group(2)
+            for groups in metric_re.finditer(iface_stats):
+                metric_stream = groups.group(1).lower()
+                metric_value = int(groups.group(2))
+                output.append(
+                    f"""{metric}{{stream="{metric_stream}","""
+                    + f"""iface="{iface_name}"}} {metric_value}""")
+    return "\n".join(output)
+
+
+def bench(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def main(argv):
+    count = int(argv[0]) if len(argv) > 0 else 300
+    iterations = int(argv[1]) if len(argv) > 1 else 50
+
+    text = ifconfig(count)
+    if not prometheus(None, text).endswith(legacy_prometheus(text) + "\n"):
+        sys.exit("The outputs of the two implementations differ.")
+
+    legacy = bench(lambda: legacy_prometheus(text), iterations)
+    single_pass = bench(lambda: prometheus(None, text), iterations)
+
+    print(f"{count} interfaces, {len(text)} bytes of ifconfig output")
+    print(f"regex per metric: {legacy * 1000:.2f} ms per scrape")
+    print(f"single pass:      {single_pass * 1000:.2f} ms per scrape")
+    print(f"speed up:         {legacy / single_pass:.1f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
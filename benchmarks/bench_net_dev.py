@@ -0,0 +1,56 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import time
+
+from zyxelprometheus import parse_ifconfig, parse_net_dev, parse_stats, \
+    render
+
+from .synthetic import ifconfig, net_dev
+
+
+def bench(func, text, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(text)
+    return (time.perf_counter() - start) / iterations
+
+
+def main(argv):
+    count = int(argv[0]) if len(argv) > 0 else 300
+    iterations = int(argv[1]) if len(argv) > 1 else 50
+
+    ifconfig_text = ifconfig(count)
+    net_dev_text = net_dev(count)
+    if render(parse_stats(None, ifconfig_text)) \
+            != render(parse_stats(None, net_dev_text)):
+        sys.exit("The outputs of the two parsers differ.")
+
+    ifconfig_time = bench(parse_ifconfig, ifconfig_text, iterations)
+    net_dev_time = bench(parse_net_dev, net_dev_text, iterations)
+
+    print(f"{count} interfaces")
+    print(f"ifconfig:      {len(ifconfig_text)} bytes, "
+          + f"{ifconfig_time * 1000:.2f} ms to parse")
+    print(f"/proc/net/dev: {len(net_dev_text)} bytes, "
+          + f"{net_dev_time * 1000:.2f} ms to parse")
+    print(f"size ratio:    {len(ifconfig_text) / len(net_dev_text):.1f}x")
+    print(f"speed up:      {ifconfig_time / net_dev_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
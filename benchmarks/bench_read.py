@@ -0,0 +1,82 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+import time
+
+from tests.mock_sshclient import MockSSHSession, PROMPT
+from zyxelprometheus.scrape import execute
+
+IFCONFIG = open("example_ifconfig.txt", "rb").read().decode("utf8")
+
+
+def legacy_read_to(stdout, readto):
+    # The original byte at a time implementation, kept for comparison.
+    endtime = time.time() + 5
+    chars = []
+    lreadto = list(readto)
+    while not stdout.channel.eof_received:
+        char = stdout.read(1).decode("utf8")
+        if char != "":
+            chars.append(char)
+            if chars[-len(readto):] == lreadto:
+                return "".join(chars[:-len(readto)])
+        if time.time() > endtime:
+            stdout.channel.close()
+            break
+    return "".join(chars)
+
+
+def legacy_execute(cmd, stdin, stdout):
+    legacy_read_to(stdout, "ZySH> ")
+    stdin.write(cmd + "\n")
+    legacy_read_to(stdout, cmd + "\r\n")
+    return legacy_read_to(stdout, "ZySH> ")
+
+
+def make_session(size):
+    session = MockSSHSession()
+    output = IFCONFIG * (size // len(IFCONFIG) + 1)
+    session.add_cmd("ifconfig\n", output)
+    return session
+
+
+def bench(execute_func, session, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        session.recv_buffer = PROMPT
+        execute_func("ifconfig", session, session)
+    return (time.perf_counter() - start) / iterations
+
+
+def main(argv):
+    size = int(argv[0]) if len(argv) > 0 else 50000
+    iterations = int(argv[1]) if len(argv) > 1 else 20
+
+    session = make_session(size)
+    legacy = bench(legacy_execute, session, iterations)
+    chunked = bench(execute, session, iterations)
+
+    output_size = len(session.cmds["ifconfig\n"])
+    print(f"ifconfig output size: {output_size} bytes")
+    print(f"byte at a time: {legacy * 1000:.2f} ms per command")
+    print(f"chunked:        {chunked * 1000:.2f} ms per command")
+    print(f"speed up:       {legacy / chunked:.1f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import time
+
+from zyxelprometheus import parse_stats, render
+from zyxelprometheus.prometheus import iface_stats_map
+
+from .synthetic import ifconfig
+
+
+def legacy_render(stats):
+    # The original implementation, which built every label set and line
+    # from scratch on each scrape, kept for comparison.
+    families = [("zyxel_up", "gauge", "Whether the router could be scraped.",
+                 [("", 1 if stats.up else 0)])]
+    for (metric, help, stat) in iface_stats_map:
+        samples = []
+        for iface in stats.interfaces:
+            for metric_stream in ("rx", "tx"):
+                metric_value = getattr(iface, f"{metric_stream}_{stat}")
+                if metric_value is None:
+                    continue
+                samples.append(
+                    (f"""{{stream="{metric_stream}","""
+                     + f"""iface="{iface.name}"}}""", metric_value))
+        families.append((metric, "counter", help, samples))
+
+    output = []
+    for (metric, metric_type, help, samples) in families:
+        if len(samples) == 0:
+            continue
+        output.append(f"# HELP {metric} {help}")
+        output.append(f"# TYPE {metric} {metric_type}")
+        for (labels, value) in samples:
+            output.append(f"{metric}{labels} {value}")
+    return "\n".join(output) + "\n"
+
+
+def bench(func, stats, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(stats)
+    return (time.perf_counter() - start) / iterations
+
+
+def main(argv):
+    count = int(argv[0]) if len(argv) > 0 else 1000
+    iterations = int(argv[1]) if len(argv) > 1 else 50
+
+    stats = parse_stats(None, ifconfig(count))
+    if legacy_render(stats) != render(stats):
+        sys.exit("The outputs of the two implementations differ.")
+
+    legacy = bench(legacy_render, stats, iterations)
+    cached = bench(render, stats, iterations)
+
+    print(f"{count} interfaces")
+    print(f"uncached: {legacy * 1000:.2f} ms per render")
+    print(f"cached:   {cached * 1000:.2f} ms per render")
+    print(f"speed up: {legacy / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,55 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = [
+    ("parse only", "import zyxelprometheus"),
+    ("one shot", "import zyxelprometheus; import paramiko"),
+    ("serve", "from zyxelprometheus import serve; import paramiko"),
+]
+
+
+def startup(code, runs):
+    # Take the quickest run, as the first can be slowed down by reading
+    # the modules from disk.
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        taken = time.perf_counter() - start
+        best = taken if best is None else min(best, taken)
+    return best
+
+
+def main(argv):
+    runs = int(argv[0]) if len(argv) > 0 else 5
+
+    python = startup("pass", runs)
+    print(f"{'python:':12} {python * 1000:.1f} ms")
+    for name, code in MODES:
+        taken = startup(code, runs)
+        print(f"{name + ':':12} {taken * 1000:.1f} ms "
+              + f"(+{(taken - python) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,53 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+
+from zyxelprometheus import get_arguments, InvalidArguments, login, \
+    login_options, logout, Shell
+from zyxelprometheus.scrape import _execute
+
+from .suite import CAPTURES
+
+
+def main(argv):
+    if len(argv) < 1:
+        sys.exit("Usage: python -m benchmarks.record DIRECTORY "
+                 + "[zyxelprometheus arguments]")
+    directory = argv[0]
+    try:
+        args = get_arguments(argv[1:])
+    except InvalidArguments as e:
+        sys.exit(f"Invalid Arguments: {e.args[0]}")
+
+    os.makedirs(directory, exist_ok=True)
+    session = login(args.host, args.user, args.passwd,
+                    **login_options(args))
+    shell = Shell(session, args.timeout)
+    try:
+        for name, (cmd, _) in CAPTURES.items():
+            output = _execute(shell, cmd, args.timeout)
+            with open(os.path.join(directory, f"{name}.txt"), "wb") as f:
+                f.write(output.encode("utf8"))
+            print(f"{cmd}: {len(output)} characters")
+    finally:
+        shell.close()
+        logout(session)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
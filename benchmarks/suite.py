@@ -0,0 +1,171 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+from tests.mock_sshclient import MockSSHSession, PROMPT
+from zyxelprometheus import parse_xdsl, render
+from zyxelprometheus.model import RouterStats
+from zyxelprometheus.parse import is_net_dev, parse_interfaces
+from zyxelprometheus.scrape import execute
+
+from .synthetic import ifconfig, net_dev
+
+CAPTURES = {
+    "xdsl": ("xdslctl info", "example_xdsl.txt"),
+    "xdsl_stats": ("xdslctl info --stats", "example_xdsl_stats.txt"),
+    "ifconfig": ("ifconfig", "example_ifconfig.txt"),
+    "net_dev": ("cat /proc/net/dev", "example_net_dev.txt"),
+}
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+DRIP_SIZE = 16
+
+parser = argparse.ArgumentParser(
+    description='Benchmark reading, parsing and rendering router output.')
+parser.add_argument('--captures', type=str,
+                    help='a directory of outputs saved by benchmarks.record '
+                    + 'to replay instead of the example files')
+parser.add_argument('--save', action="store_true", default=False,
+                    help='save the results as the new baseline')
+parser.add_argument('--check', action="store_true", default=False,
+                    help='exit with an error if any result is slower than '
+                    + 'the baseline')
+parser.add_argument('--baseline', type=str, default=BASELINE,
+                    help='the baseline file to use')
+parser.add_argument('--tolerance', type=float, default=0.5,
+                    help='how much slower than the baseline a result can be '
+                    + 'before --check fails')
+
+
+def load_captures(directory=None):
+    captures = {}
+    for name, (cmd, example) in CAPTURES.items():
+        filename = example if directory is None \
+            else os.path.join(directory, f"{name}.txt")
+        if os.path.exists(filename):
+            captures[name] = (cmd, open(filename, "rb").read()
+                              .decode("utf8"))
+    return captures
+
+
+def scenarios(captures):
+    for name, (cmd, output) in captures.items():
+        yield f"replay/{name}", cmd, output
+    for count in (300, 1000):
+        yield f"synthetic/ifconfig-{count}", "ifconfig", ifconfig(count)
+        yield f"synthetic/net_dev-{count}", "cat /proc/net/dev", \
+            net_dev(count)
+
+
+def reader(cmd, output, read_size=None):
+    session = MockSSHSession()
+    session.add_cmd(cmd + "\n", output)
+    session.read_size = read_size
+
+    def read():
+        session.recv_buffer = PROMPT
+        execute(cmd, session, session)
+    return read
+
+
+def parser_for(cmd, output):
+    if cmd.startswith("xdslctl"):
+        return lambda: parse_xdsl(output)
+    return lambda: parse_interfaces(output)
+
+
+def renderer_for(cmd, output):
+    if cmd.startswith("xdslctl"):
+        stats = RouterStats(xdsl=parse_xdsl(output))
+    else:
+        stats = RouterStats(interfaces=parse_interfaces(output))
+    return lambda: render(stats)
+
+
+def measure(func, min_time=0.05):
+    # Double the number of calls until they take long enough to time, then
+    # take the best of three runs to reduce the noise.
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def benchmarks(captures):
+    for name, cmd, output in scenarios(captures):
+        if cmd == "cat /proc/net/dev" and not is_net_dev(output):
+            continue
+        size = len(output.encode("utf8"))
+        yield f"read/{name}", size, reader(cmd, output)
+        yield f"read-drip/{name}", size, reader(cmd, output, DRIP_SIZE)
+        yield f"parse/{name}", size, parser_for(cmd, output)
+        yield f"render/{name}", size, renderer_for(cmd, output)
+
+
+def run(captures):
+    results = {}
+    funcs = {}
+    for name, size, func in benchmarks(captures):
+        taken = measure(func)
+        results[name] = taken
+        funcs[name] = func
+        print(f"{name:40} {taken * 1000:9.3f} ms "
+              + f"{size / taken / 1e6:9.1f} MB/s")
+    return results, funcs
+
+
+def check(results, funcs, baseline, tolerance):
+    regressions = []
+    for name, taken in results.items():
+        if name not in baseline:
+            continue
+        limit = baseline[name] * (1 + tolerance)
+        if taken > limit:
+            # Measure again in case something else was using the CPU.
+            taken = min(taken, measure(funcs[name]))
+        if taken > limit:
+            regressions.append(f"{name}: {taken * 1000:.3f} ms, baseline "
+                               + f"{baseline[name] * 1000:.3f} ms")
+    return regressions
+
+
+def main(argv):
+    args = parser.parse_args(argv)
+
+    results, funcs = run(load_captures(args.captures))
+
+    if args.check:
+        with open(args.baseline) as f:
+            regressions = check(results, funcs, json.load(f),
+                                args.tolerance)
+        if regressions:
+            sys.exit("Slower than the baseline:\n" + "\n".join(regressions))
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,61 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+IFACE = """{name}    Link encap:Ethernet  HWaddr E4:18:6B:06:87:70\r
+          inet6 addr: fe80::e618:6bff:fe06:8770/64 Scope:Link\r
+          UP BROADCAST RUNNING MULTICAST  MTU:1500  Metric:1\r
+          RX packets:{rx_packets} errors:0 dropped:{drop} overruns:0 frame:0\r
+          TX packets:{tx_packets} errors:0 dropped:0 overruns:0 carrier:0\r
+          collisions:0 txqueuelen:0\r
+          RX bytes:{rx_bytes} (2.5 GiB)  TX bytes:{tx_bytes} (1.2 GiB)\r
+\r
+"""
+
+
+NET_DEV_HEADER = """Inter-|   Receive                                                |  Transmit\r
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\r
+"""  # noqa: E501
+
+NET_DEV_IFACE = "{name:>6}:{rx_bytes:8} {rx_packets:7}    0 {drop:4}    0" \
+    + "     0          0         0 {tx_bytes:8} {tx_packets:7}    0    0" \
+    + "    0     0       0          0\r\n"
+
+
+def iface_name(index):
+    kind = ["eth0.", "ppp", "ptm0.", "wl0."][index % 4]
+    return f"{kind}{index}"
+
+
+def ifconfig(count):
+    return "".join(IFACE.format(name=iface_name(index),
+                                rx_packets=7968422 + index,
+                                tx_packets=11495200 + index,
+                                drop=index % 7,
+                                rx_bytes=2713281739 + index * 1000,
+                                tx_bytes=1342943018 + index * 1000)
+                   for index in range(count))
+
+
+def net_dev(count):
+    return NET_DEV_HEADER + "".join(
+        NET_DEV_IFACE.format(name=iface_name(index),
+                             rx_packets=7968422 + index,
+                             tx_packets=11495200 + index,
+                             drop=index % 7,
+                             rx_bytes=2713281739 + index * 1000,
+                             tx_bytes=1342943018 + index * 1000)
+        for index in range(count))
@@ -2,4 +2,4 @@
 
 set -e
 
-pycodestyle bin/ zyxelprometheus/ tests/
+pycodestyle bin/ zyxelprometheus/ tests/ benchmarks/
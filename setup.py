@@ -33,7 +33,8 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/andrewjw/zyxelprometheus",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(
+        exclude=["benchmarks", "benchmarks.*", "tests", "tests.*"]),
     scripts=["bin/zyxelprometheus"],
     classifiers=[
         "Programming Language :: Python :: 3.8",
@@ -21,7 +21,14 @@ import paramiko.client
 paramiko.client.SSHClient = MockSSHClient
 
 from .test_arguments import TestArguments  # noqa
+from .test_counters import TestCounters  # noqa
+from .test_instrumentation import TestInstrumentation  # noqa
+from .test_offline import TestOffline  # noqa
 from .test_login import TestLogin  # noqa
 from .test_prometheus import TestPrometheus  # noqa
+from .test_sampler import TestSampler  # noqa
 from .test_scrape import TestScrape  # noqa
 from .test_server import TestServer  # noqa
+from .test_spool import TestSpool  # noqa
+from .test_startup import TestStartup  # noqa
+from .test_textfile import TestTextfile  # noqa
@@ -17,23 +17,33 @@
 import time
 
 from paramiko.ssh_exception import AuthenticationException, \
-                                   NoValidConnectionsError
+                                   NoValidConnectionsError, SSHException
 
 PROMPT = "ZySH> ".encode("utf8")
 
 
 class MockSSHClient:
     mock_sessions = {}
+    connections = 0
 
     def __init__(self):
         self.missing_host_key_policy = None
         self.current_session = None
-
-    def connect(self, hostname, username, password):
+        self.exec_count = 0
+        self.transport = None
+        self.connect_count = 0
+        self.connect_kwargs = None
+        self.host_keys_filename = None
+
+    def connect(self, hostname, username, password, **kwargs):
+        self.connect_count += 1
+        MockSSHClient.connections += 1
+        self.connect_kwargs = kwargs
         if (hostname, username, password) in self.mock_sessions:
             self.current_session = self.mock_sessions[(hostname,
                                                        username,
                                                        password)]
+            self.transport = MockTransport()
             return
 
         for session_key in self.mock_sessions.keys():
@@ -41,55 +51,126 @@ class MockSSHClient:
                 raise AuthenticationException("Authentication failed.")
         raise NoValidConnectionsError({(hostname, 22): True})
 
+    def load_host_keys(self, filename):
+        self.host_keys_filename = filename
+
     def set_missing_host_key_policy(self, policy):
         self.missing_host_key_policy = policy
 
+    def get_transport(self):
+        return self.transport
+
     def exec_command(self, cmd, get_pty=False):
-        return self.current_session, self.current_session, None
+        if self.transport is None or not self.transport.active:
+            raise SSHException("SSH session not active")
+        self.exec_count += 1
+        stream = self.current_session.open_channel()
+        return stream, stream, None
 
     def close(self):
         self.current_session = None
+        if self.transport is not None:
+            self.transport.active = False
 
     @classmethod
     def reset(cls):
         cls.mock_sessions = {}
+        cls.connections = 0
 
     @classmethod
     def add_session(cls, host, user, password, session):
         cls.mock_sessions[(host, user, password)] = session
 
 
-class MockSSHSession:
+class MockTransport:
     def __init__(self):
-        self.cmds = {}
-        self.channel = MockChannel()
+        self.active = True
+        self.keepalive = 0
 
-        self.recv_buffer = PROMPT
+    def set_keepalive(self, interval):
+        self.keepalive = interval
 
-    def add_cmd(self, cmd, response):
-        self.cmds[cmd] = response.encode("utf8")
+    def is_active(self):
+        return self.active
+
+
+class MockStream:
+    def __init__(self, session):
+        self.session = session
+        self.channel = MockChannel(self)
+        self.recv_buffer = PROMPT
+        self.hung = False
+        self.closing = False
 
     def write(self, cmd):
-        if cmd in self.cmds:
+        if self.channel.closed:
+            raise OSError("Socket is closed")
+        if cmd in self.session.cmds:
+            delay = self.session.delays.get(cmd)
+            if delay:
+                time.sleep(delay)
+            response = self.session.cmds[cmd]
+            # A command without a response never finishes.
+            self.hung = response is None
+            self.closing = cmd in self.session.closes
             self.recv_buffer = cmd.replace("\n", "\r\n").encode("utf8") \
-                             + self.cmds[cmd]
+                + (response or b"")
         else:
             raise ValueError(f"Unset command used. {repr(cmd)}")
 
     def read(self, count):
-        if len(self.recv_buffer) <= count:
-            data = self.recv_buffer
-            self.recv_buffer = PROMPT
-            return data
+        if self.session.read_size is not None:
+            count = min(count, self.session.read_size)
+        # Slice a memoryview so that reading in small chunks doesn't copy
+        # the rest of the buffer each time.
+        buffer = memoryview(self.recv_buffer)
+        if len(buffer) <= count:
+            self.recv_buffer = b"" if self.hung or self.closing else PROMPT
+            if self.closing:
+                # The router closes the channel before the prompt.
+                self.channel.closed = True
+            return bytes(buffer)
+        else:
+            self.recv_buffer = buffer[count:]
+            return bytes(buffer[:count])
+
+
+class MockSSHSession(MockStream):
+    def __init__(self):
+        self.cmds = {}
+        self.delays = {}
+        self.closes = set()
+        self.read_size = None
+        self.channels_opened = 0
+
+        super().__init__(self)
+
+    def open_channel(self):
+        # Each channel gets its own buffer, so that several commands can
+        # run at once like they can on a real SSH transport.
+        stream = MockStream(self)
+        self.channel = stream.channel
+        self.channels_opened += 1
+        return stream
+
+    def add_cmd(self, cmd, response, delay=0, close=False):
+        self.cmds[cmd] = response.encode("utf8") \
+            if response is not None else None
+        self.delays[cmd] = delay
+        if close:
+            self.closes.add(cmd)
         else:
-            data = self.recv_buffer[:count]
-            self.recv_buffer = self.recv_buffer[count:]
-            return data
+            self.closes.discard(cmd)
 
 
 class MockHungSSHSession:
     def __init__(self):
-        self.channel = MockChannel()
+        self.channel = MockChannel(self)
+        self.recv_buffer = b""
+
+    def open_channel(self):
+        self.channel = MockChannel(self)
+        return self
 
     def write(self, cmd):
         pass
@@ -100,8 +181,16 @@ class MockHungSSHSession:
 
 
 class MockChannel:
-    def __init__(self):
+    def __init__(self, session):
+        self.session = session
         self.eof_received = False
+        self.closed = False
+
+    def recv_ready(self):
+        return len(self.session.recv_buffer) > 0
+
+    def recv(self, count):
+        return self.session.read(count)
 
     def close(self):
-        pass
+        self.closed = True
@@ -47,3 +47,103 @@ class TestArguments(unittest.TestCase):
     def test_serve_and_raise(self):
         self.assertRaises(InvalidArguments, get_arguments,
                           ["--passwd", "testpassword", "-d", "--raw"])
+
+    def test_max_sessions(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--passwd", "testpassword",
+                           "--max-sessions", "0"])
+
+    def test_max_staleness_default(self):
+        args = get_arguments(["--passwd", "testpassword",
+                              "--scrape-interval", "10"])
+        self.assertEqual(30, args.max_staleness)
+
+    def test_max_staleness_without_interval(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--passwd", "testpassword",
+                           "--max-staleness", "10"])
+
+    def test_ssh_ciphers(self):
+        args = get_arguments(["--passwd", "testpassword",
+                              "--ssh-ciphers", "aes128-ctr, aes256-ctr"])
+        self.assertEqual(["aes128-ctr", "aes256-ctr"], args.ssh_ciphers)
+        self.assertIsNone(args.ssh_kex)
+
+    def test_negative_keepalive(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--passwd", "testpassword",
+                           "--ssh-keepalive", "-1"])
+
+    def test_iface_filters(self):
+        args = get_arguments(["--passwd", "testpassword",
+                              "--iface-include", "ppp.*|br0"])
+        self.assertIsNotNone(args.iface_include.fullmatch("ppp0.1"))
+        self.assertIsNone(args.iface_exclude)
+
+    def test_invalid_iface_filter(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--passwd", "testpassword",
+                           "--iface-exclude", "eth("])
+
+    def test_scrape_timeout_default(self):
+        args = get_arguments(["--passwd", "testpassword", "--timeout", "3"])
+        self.assertEqual(6, args.scrape_timeout)
+
+    def test_invalid_scrape_timeout(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--passwd", "testpassword",
+                           "--scrape-timeout", "0"])
+
+    def test_spool_without_interval(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--passwd", "testpassword",
+                           "--spool-dir", "/tmp"])
+
+    def test_targets(self):
+        args = get_arguments(["--passwd", "testpassword",
+                              "--textfile-dir", "/tmp",
+                              "--targets", "192.168.1.1, 192.168.2.1"])
+        self.assertEqual(["192.168.1.1", "192.168.2.1"], args.targets)
+
+    def test_targets_default(self):
+        args = get_arguments(["--passwd", "testpassword",
+                              "--host", "192.168.2.1"])
+        self.assertEqual(["192.168.2.1"], args.targets)
+
+    def test_targets_serve(self):
+        args = get_arguments(["--passwd", "testpassword", "-d",
+                              "--targets", "192.168.1.1,192.168.2.1"])
+        self.assertEqual(["192.168.1.1", "192.168.2.1"], args.targets)
+
+    def test_max_sessions_default(self):
+        args = get_arguments(["--passwd", "testpassword", "-d",
+                              "--targets", "192.168.1.1,192.168.2.1"])
+        self.assertEqual(2, args.max_sessions)
+
+    def test_targets_without_textfile(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--passwd", "testpassword",
+                           "--targets", "192.168.1.1"])
+
+    def test_textfile_and_serve(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--passwd", "testpassword", "-d",
+                           "--textfile-dir", "/tmp"])
+
+    def test_offline_without_password(self):
+        args = get_arguments(["--capture-file", "-"])
+        self.assertTrue(args.offline)
+        self.assertEqual("prometheus", args.output_format)
+
+    def test_offline_and_serve(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--xdsl-file", "xdsl.txt", "-d"])
+
+    def test_capture_file_and_xdsl_file(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--capture-file", "captures.txt",
+                           "--xdsl-file", "xdsl.txt"])
+
+    def test_two_files_from_stdin(self):
+        self.assertRaises(InvalidArguments, get_arguments,
+                          ["--xdsl-file", "-", "--ifconfig-file", "-"])
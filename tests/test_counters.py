@@ -0,0 +1,90 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from zyxelprometheus.counters import CounterTracker, WRAP_32
+from zyxelprometheus.model import InterfaceCounters
+
+
+class TestCounters(unittest.TestCase):
+    def test_first_value(self):
+        tracker = CounterTracker()
+
+        self.assertEqual(2713281739, tracker.update("eth0", 2713281739))
+
+    def test_increase(self):
+        tracker = CounterTracker()
+        tracker.update("eth0", 100)
+
+        self.assertEqual(150, tracker.update("eth0", 150))
+        self.assertEqual(150, tracker.update("eth0", 150))
+
+    def test_wrap(self):
+        tracker = CounterTracker()
+        tracker.update("eth0", WRAP_32 - 100)
+
+        self.assertEqual(WRAP_32 + 50, tracker.update("eth0", 50))
+        self.assertEqual(WRAP_32 + 60, tracker.update("eth0", 60))
+        self.assertEqual(1, tracker.wraps)
+        self.assertEqual(0, tracker.resets)
+
+    def test_reset(self):
+        tracker = CounterTracker()
+        tracker.update("eth0", 1000000)
+
+        self.assertEqual(1000050, tracker.update("eth0", 50))
+        self.assertEqual(0, tracker.wraps)
+        self.assertEqual(1, tracker.resets)
+
+    def test_reset_after_reconnect(self):
+        # The router rebooted while the counter was in the upper half, so
+        # the drop would otherwise look like a wrap.
+        tracker = CounterTracker()
+        tracker.update("eth0", 2713281739)
+        tracker.reconnected()
+
+        self.assertEqual(2718281739, tracker.update("eth0", 5000000))
+        self.assertEqual(0, tracker.wraps)
+        self.assertEqual(1, tracker.resets)
+
+        # Only the first value after logging in again is affected.
+        tracker.update("eth0", WRAP_32 - 100)
+        self.assertEqual(2718281739 + WRAP_32 - 5000100 + 150,
+                         tracker.update("eth0", 50))
+        self.assertEqual(1, tracker.wraps)
+
+    def test_64bit_counter_reset(self):
+        tracker = CounterTracker()
+        tracker.update("eth0", WRAP_32 + 1000)
+
+        self.assertEqual(WRAP_32 + 1050, tracker.update("eth0", 50))
+        self.assertEqual(1, tracker.resets)
+
+    def test_update_interfaces(self):
+        tracker = CounterTracker()
+        tracker.update_interfaces([
+            InterfaceCounters("eth0", rx_bytes=WRAP_32 - 10, tx_bytes=5),
+            InterfaceCounters("ppp0", rx_bytes=7)])
+
+        eth0 = InterfaceCounters("eth0", rx_bytes=20, tx_bytes=6,
+                                 txqueuelen=1000)
+        tracker.update_interfaces([eth0])
+
+        self.assertEqual(WRAP_32 + 20, eth0.rx_bytes)
+        self.assertEqual(6, eth0.tx_bytes)
+        self.assertEqual(1000, eth0.txqueuelen)
+        self.assertNotIn(("ppp0", "rx_bytes"), tracker.previous)
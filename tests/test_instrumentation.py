@@ -0,0 +1,71 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+
+from zyxelprometheus.instrumentation import Counter, Histogram
+from zyxelprometheus.prometheus import format_families
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_counter(self):
+        counter = Counter("test_total", "A test counter.")
+        self.assertEqual(("test_total", "counter", "A test counter.",
+                          [("", 0)]), counter.family())
+
+        counter.inc()
+        counter.inc(amount=2)
+
+        self.assertEqual([("", 3)], counter.family()[3])
+
+    def test_counter_labels(self):
+        counter = Counter("test_total", "A test counter.", ("command", ))
+        self.assertEqual([], counter.family()[3])
+
+        counter.inc("ifconfig")
+
+        self.assertEqual([("""{command="ifconfig"}""", 1)],
+                         counter.family()[3])
+
+    def test_histogram(self):
+        histogram = Histogram("test_seconds", "A test histogram.",
+                              (0.1, 1), ("command", ))
+
+        histogram.observe(0.05, "ifconfig")
+        histogram.observe(0.5, "ifconfig")
+        histogram.observe(5, "ifconfig")
+
+        output = format_families([histogram.family()])
+        self.assertIn("# TYPE test_seconds histogram", output)
+        self.assertIn("""test_seconds_bucket{command="ifconfig",le="0.1"}"""
+                      + " 1", output)
+        self.assertIn("""test_seconds_bucket{command="ifconfig",le="1.0"}"""
+                      + " 2", output)
+        self.assertIn("""test_seconds_bucket{command="ifconfig",le="+Inf"}"""
+                      + " 3", output)
+        self.assertIn("""test_seconds_sum{command="ifconfig"} 5.55""",
+                      output)
+        self.assertIn("""test_seconds_count{command="ifconfig"} 3""",
+                      output)
+
+    def test_histogram_time(self):
+        histogram = Histogram("test_seconds", "A test histogram.", (1, ))
+
+        with histogram.time():
+            pass
+
+        self.assertIn(("_count", 1), histogram.family()[3])
@@ -19,7 +19,12 @@ import json
 import unittest
 from unittest.mock import patch
 
-from zyxelprometheus import login, logout, InvalidPassword
+import os
+import tempfile
+
+from zyxelprometheus import get_arguments, login, login_options, logout, \
+                            InvalidArguments, InvalidPassword
+from zyxelprometheus.instrumentation import AUTH_FAILURES
 
 from .mock_sshclient import MockSSHClient, MockSSHSession
 
@@ -51,9 +56,13 @@ class TestLogin(unittest.TestCase):
         self.assertIsNotNone(session.current_session)
 
     def test_wrong_password(self):
+        failures = AUTH_FAILURES.family()[3][0][1]
+
         with self.assertRaises(InvalidPassword):
             login("192.168.1.1", "admin", "wrongpassword")
 
+        self.assertEqual(failures + 1, AUTH_FAILURES.family()[3][0][1])
+
     def test_logout(self):
         session = login("192.168.1.1",
                         "admin",
@@ -62,3 +71,53 @@ class TestLogin(unittest.TestCase):
         logout(session)
 
         self.assertIsNone(session.current_session)
+
+    def test_transport_options(self):
+        session = login("192.168.1.1", "admin", "testpassword",
+                        timeout=3, keepalive=30, compress=True,
+                        ciphers=["aes128-ctr"])
+
+        kwargs = session.connect_kwargs
+        self.assertEqual(3, kwargs["timeout"])
+        self.assertTrue(kwargs["compress"])
+        self.assertFalse(kwargs["look_for_keys"])
+        self.assertNotIn("aes128-ctr",
+                         kwargs["disabled_algorithms"]["ciphers"])
+        self.assertIn("aes256-ctr", kwargs["disabled_algorithms"]["ciphers"])
+        self.assertNotIn("kex", kwargs["disabled_algorithms"])
+        self.assertEqual(30, session.get_transport().keepalive)
+
+    def test_default_options(self):
+        session = login("192.168.1.1", "admin", "testpassword")
+
+        self.assertIsNone(session.connect_kwargs["disabled_algorithms"])
+        self.assertFalse(session.connect_kwargs["compress"])
+        self.assertEqual(0, session.get_transport().keepalive)
+        self.assertIsNone(session.host_keys_filename)
+
+    def test_unknown_cipher(self):
+        with self.assertRaises(InvalidArguments):
+            login("192.168.1.1", "admin", "testpassword",
+                  ciphers=["rot13"])
+
+    def test_known_hosts_created(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "known_hosts")
+            session = login("192.168.1.1", "admin", "testpassword",
+                            known_hosts=filename)
+
+            self.assertTrue(os.path.exists(filename))
+            self.assertEqual(filename, session.host_keys_filename)
+
+    def test_login_options(self):
+        args = get_arguments(["--passwd", "testpassword",
+                              "--ssh-kex", "curve25519-sha256@libssh.org",
+                              "--ssh-compression"])
+        session = login("192.168.1.1", "admin", "testpassword",
+                        **login_options(args))
+
+        kwargs = session.connect_kwargs
+        self.assertEqual(5, kwargs["timeout"])
+        self.assertTrue(kwargs["compress"])
+        self.assertNotIn("curve25519-sha256@libssh.org",
+                         kwargs["disabled_algorithms"]["kex"])
@@ -0,0 +1,169 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from zyxelprometheus import convert_captures, get_arguments, \
+    InvalidArguments, parse_captures, read_captures
+from zyxelprometheus.offline import merge_captures
+
+XDSL = open("example_xdsl.txt", "rb").read().decode("utf8")
+IFCONFIG = open("example_ifconfig.txt", "rb").read().decode("utf8")
+NET_DEV = open("example_net_dev.txt", "rb").read().decode("utf8")
+
+
+def lines(text):
+    return io.StringIO(text, newline="")
+
+
+class TestOffline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name, text):
+        filename = os.path.join(self.tmpdir.name, name)
+        with open(filename, "w", newline="") as f:
+            f.write(text)
+        return filename
+
+    def test_single_capture(self):
+        captures = list(read_captures(lines(XDSL + IFCONFIG)))
+
+        self.assertEqual(1, len(captures))
+        timestamp, xdsl, ifconfig = captures[0]
+        self.assertIsNone(timestamp)
+        self.assertIn("Status: Showtime", xdsl)
+        self.assertNotIn("Link encap", xdsl)
+        self.assertTrue(ifconfig.startswith("bcmsw "))
+
+    def test_concatenated_captures(self):
+        archive = "@1600000000\n" + XDSL + NET_DEV \
+            + "@1600000060.5\n" + XDSL + IFCONFIG \
+            + XDSL + IFCONFIG
+
+        stats = list(parse_captures(read_captures(lines(archive))))
+
+        self.assertEqual([1600000000, 1600000060.5, None],
+                         [timestamp for timestamp, _ in stats])
+        self.assertEqual(14, len(stats[0][1].interfaces))
+        self.assertEqual(14, len(stats[1][1].interfaces))
+        self.assertEqual(14, len(stats[2][1].interfaces))
+        for timestamp, capture in stats:
+            self.assertEqual("Showtime", capture.xdsl.status)
+
+    def test_repeated_ifconfig(self):
+        # Without a marker or xdslctl output between them, a new capture
+        # starts when an interface is seen again.
+        stats = list(parse_captures(read_captures(lines(IFCONFIG * 3),
+                                                  "ifconfig")))
+
+        self.assertEqual(3, len(stats))
+        for timestamp, capture in stats:
+            self.assertIsNone(capture.xdsl)
+            self.assertEqual(14, len(capture.interfaces))
+
+    def test_default_section(self):
+        # The echoed command before the output is kept in the default
+        # section, rather than starting a capture of its own.
+        captures = list(read_captures(lines(NET_DEV), "ifconfig"))
+
+        self.assertEqual(1, len(captures))
+        self.assertIsNone(captures[0][1])
+
+    def test_merge_captures(self):
+        merged = list(merge_captures(
+            read_captures(lines("@10\n" + XDSL + "@20\n" + XDSL), "xdsl"),
+            read_captures(lines(IFCONFIG), "ifconfig")))
+
+        self.assertEqual([10, 20], [timestamp for timestamp, _, _ in merged])
+        self.assertIsNotNone(merged[0][2])
+        self.assertIsNone(merged[1][2])
+
+    def test_convert_prometheus(self):
+        args = get_arguments(["--xdsl-file", self.write("xdsl.txt", XDSL),
+                              "--ifconfig-file",
+                              self.write("ifconfig.txt", IFCONFIG)])
+        output = io.StringIO()
+        convert_captures(args, output)
+
+        self.assertIn("""zyxel_line_rate{bearer="0",stream="up"} 7833000\n""",
+                      output.getvalue())
+        self.assertIn("""zyxel_bytes{stream="rx",iface="br0"}""",
+                      output.getvalue())
+
+    def test_convert_prometheus_groups_captures(self):
+        filename = self.write("captures.txt",
+                              "@1600000000\n" + XDSL + IFCONFIG
+                              + "@1600000060\n" + XDSL + NET_DEV)
+        args = get_arguments(["--capture-file", filename,
+                              "--iface-include", "br0"])
+        output = io.StringIO()
+        convert_captures(args, output)
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(1, lines.count("# TYPE zyxel_line_rate gauge"))
+        self.assertIn("""zyxel_line_rate{bearer="0",stream="up"} 7833000 """
+                      + "1600000000000", lines)
+        self.assertIn("""zyxel_line_rate{bearer="0",stream="up"} 7833000 """
+                      + "1600000060000", lines)
+        self.assertNotIn("# EOF", lines)
+
+    def test_convert_openmetrics(self):
+        filename = self.write("captures.txt",
+                              "@1600000000\n" + XDSL
+                              + "@1600000060\n" + XDSL)
+        args = get_arguments(["--capture-file", filename,
+                              "--output-format", "openmetrics"])
+        output = io.StringIO()
+        convert_captures(args, output)
+
+        lines = output.getvalue().splitlines()
+        self.assertIn("""zyxel_line_rate{bearer="0",stream="up"} 7833000 """
+                      + "1600000060.000", lines)
+        self.assertEqual("# EOF", lines[-1])
+
+    def test_convert_prometheus_without_timestamps(self):
+        filename = self.write("captures.txt", XDSL + XDSL)
+        args = get_arguments(["--capture-file", filename])
+
+        with self.assertRaises(InvalidArguments):
+            convert_captures(args, io.StringIO())
+
+    def test_convert_json(self):
+        filename = self.write("captures.txt",
+                              "@1600000000\n" + XDSL + IFCONFIG
+                              + "@1600000060\n" + XDSL + NET_DEV)
+        args = get_arguments(["--capture-file", filename,
+                              "--output-format", "json",
+                              "--iface-include", "br0"])
+        output = io.StringIO()
+        convert_captures(args, output)
+
+        records = [json.loads(line)
+                   for line in output.getvalue().splitlines()]
+        self.assertEqual([1600000000, 1600000060],
+                         [record["timestamp"] for record in records])
+        self.assertEqual(7833000,
+                         records[0]["xdsl"]["bearers"][0]["upstream"])
+        self.assertEqual(["br0"], [iface["name"]
+                                   for iface in records[1]["interfaces"]])
@@ -16,12 +16,19 @@
 
 from base64 import b64decode
 import json
+import re
 import unittest
 
-from zyxelprometheus import prometheus
+from zyxelprometheus import parse_ifconfig, parse_net_dev, parse_stats, \
+    parse_xdsl, prometheus, render
+from zyxelprometheus.model import InterfaceCounters, RouterStats
+from zyxelprometheus.prometheus import escape_label, format_timestamp, \
+    metric_families, Renderer
 
 XDSL = open("example_xdsl.txt", "rb").read().decode("utf8")
 IFCONFIG = open("example_ifconfig.txt", "rb").read().decode("utf8")
+NET_DEV = open("example_net_dev.txt", "rb").read().decode("utf8")
+XDSL_STATS = open("example_xdsl_stats.txt", "rb").read().decode("utf8")
 
 
 class TestPrometheus(unittest.TestCase):
@@ -32,3 +39,205 @@ class TestPrometheus(unittest.TestCase):
                       prom)
         self.assertIn("""zyxel_packets{stream="tx",iface="ppp2.3"}"""
                       + """ 7334759""", prom)
+
+    def test_parse_ifconfig(self):
+        ifaces = parse_ifconfig(IFCONFIG)
+
+        self.assertEqual(14, len(ifaces))
+        br0 = ifaces[1]
+        self.assertEqual("br0", br0.name)
+        self.assertEqual(["UP", "BROADCAST", "RUNNING", "ALLMULTI",
+                          "MULTICAST"], br0.flags)
+        self.assertEqual(1500, br0.mtu)
+        self.assertEqual(2713281739, br0.rx_bytes)
+        self.assertEqual(1342943018, br0.tx_bytes)
+        self.assertEqual(19510, br0.rx_dropped)
+        self.assertEqual(0, br0.tx_carrier)
+        self.assertEqual(0, br0.collisions)
+        self.assertEqual(0, br0.txqueuelen)
+
+    def test_last_iface_without_blank_line(self):
+        ifaces = parse_ifconfig(IFCONFIG.rstrip())
+
+        self.assertEqual("ptm0.3", ifaces[-1].name)
+        self.assertEqual(2756363550, ifaces[-1].tx_bytes)
+
+    def test_parse_xdsl(self):
+        xdsl = parse_xdsl(XDSL)
+
+        self.assertEqual("Showtime", xdsl.status)
+        self.assertEqual(7833000, xdsl.max_upstream)
+        self.assertEqual(47522000, xdsl.max_downstream)
+        self.assertEqual(2, len(xdsl.bearers))
+        self.assertEqual(39999000, xdsl.bearers[0].downstream)
+
+    def test_parse_xdsl_without_max(self):
+        xdsl = parse_xdsl("Status: Idle\r\n")
+
+        self.assertEqual("Idle", xdsl.status)
+        self.assertIsNone(xdsl.max_upstream)
+        self.assertNotIn("zyxel_max_line_rate",
+                         render(parse_stats("Status: Idle\r\n", None)))
+
+    def test_render_matches_prometheus(self):
+        self.assertEqual(prometheus(XDSL, IFCONFIG),
+                         render(parse_stats(XDSL, IFCONFIG)))
+
+    def test_parse_xdsl_stats(self):
+        xdsl = parse_xdsl(XDSL_STATS)
+
+        self.assertEqual(47522000, xdsl.max_downstream)
+        self.assertEqual(9.1, xdsl.snr_margin.down)
+        self.assertEqual(6.4, xdsl.snr_margin.up)
+        self.assertEqual(13.8, xdsl.attenuation.down)
+        self.assertEqual(5.6, xdsl.power.up)
+        self.assertEqual(1234, xdsl.fec.down)
+        self.assertEqual(12, xdsl.crc.up)
+        self.assertEqual(28, xdsl.es.up)
+        self.assertEqual(32, xdsl.uas.down)
+        self.assertEqual(7, xdsl.hec[0].down)
+        self.assertEqual(0, xdsl.last_retrain_reason)
+        self.assertEqual(((24 + 22) * 60 + 46) * 60 + 16, xdsl.link_uptime)
+
+    def test_xdsl_hec_single_value(self):
+        xdsl = XDSL_STATS.replace("HEC:\t\t7\t\t2", "HEC:\t\t7", 1)
+        self.assertNotEqual(XDSL_STATS, xdsl)
+
+        status = parse_xdsl(xdsl)
+        self.assertNotIn(0, status.hec)
+
+        prom = render(RouterStats(xdsl=status))
+        self.assertNotIn("zyxel_xdsl_hec_errors{bearer=\"0\"", prom)
+
+        status.hec[0] = None
+        self.assertIn("zyxel_up 1", render(RouterStats(xdsl=status)))
+
+    def test_xdsl_stats_not_a_number(self):
+        xdsl = XDSL_STATS.replace("HEC:\t\t7\t\t2", "HEC:\t\tN/A\t\t2", 1)
+        xdsl = re.sub(r"SNR \(dB\):.*", "SNR (dB):\t N/A\t\t 6.4", xdsl)
+        xdsl = re.sub(r"Attn\(dB\):.*", "Attn(dB):\t N/A\t\t N/A", xdsl)
+
+        status = parse_xdsl(xdsl)
+        self.assertIsNone(status.snr_margin.down)
+        self.assertEqual(6.4, status.snr_margin.up)
+        self.assertIsNone(status.attenuation)
+
+        prom = render(RouterStats(xdsl=status))
+        self.assertIn("""zyxel_xdsl_snr_margin_db{stream="up"} 6.4""",
+                      prom)
+        self.assertNotIn("""zyxel_xdsl_snr_margin_db{stream="down"}""",
+                         prom)
+        self.assertNotIn("zyxel_xdsl_attenuation", prom)
+        self.assertIn("zyxel_xdsl_hec_errors{bearer=\"0\",stream=\"up\"} 2",
+                      prom)
+        self.assertNotIn("N/A", prom)
+
+    def test_xdsl_stats_values(self):
+        prom = prometheus(XDSL_STATS, None)
+
+        self.assertIn("""zyxel_xdsl_snr_margin_db{stream="down"} 9.1""",
+                      prom)
+        self.assertIn("""zyxel_xdsl_crc_errors{stream="up"} 12""", prom)
+        self.assertIn("""zyxel_xdsl_hec_errors{bearer="0",stream="down"}"""
+                      + """ 7""", prom)
+        self.assertIn("zyxel_xdsl_link_uptime_seconds 168376", prom)
+        self.assertNotIn("zyxel_xdsl_snr_margin_db",
+                         prometheus(XDSL, None))
+
+    def test_metadata_once_per_family(self):
+        prom = prometheus(XDSL, IFCONFIG)
+
+        self.assertEqual(1, prom.count("# TYPE zyxel_line_rate gauge"))
+        self.assertEqual(1, prom.count("# HELP zyxel_bytes "))
+
+    def test_openmetrics(self):
+        prom = prometheus(XDSL_STATS, IFCONFIG, openmetrics=True)
+
+        self.assertIn("# TYPE zyxel_bytes counter", prom)
+        self.assertIn("""zyxel_bytes_total{stream="rx",iface="br0"}"""
+                      + """ 2713281739""", prom)
+        self.assertIn("""zyxel_xdsl_crc_errors_total{stream="up"} 12""",
+                      prom)
+        self.assertIn("""zyxel_line_rate{bearer="0",stream="up"} 7833000""",
+                      prom)
+        self.assertTrue(prom.endswith("# EOF\n"))
+
+    def test_timestamp(self):
+        self.assertEqual(" 1600000000500", format_timestamp(1600000000.5))
+        self.assertEqual(" 1600000000.500",
+                         format_timestamp(1600000000.5, openmetrics=True))
+        self.assertEqual("", format_timestamp(None))
+
+    def test_escape_label(self):
+        self.assertEqual('a\\"b\\\\c\\n', escape_label('a"b\\c\n'))
+
+        prom = render(RouterStats(interfaces=[
+            InterfaceCounters('eth"0', rx_bytes=1)]))
+        self.assertIn("""zyxel_bytes{stream="rx",iface="eth\\"0"} 1""",
+                      prom)
+
+    def test_renderer_cache(self):
+        renderer = Renderer()
+        families = metric_families(parse_stats(XDSL, IFCONFIG))
+
+        first = renderer.format_families(families)
+        self.assertEqual(first, renderer.format_families(families))
+        self.assertEqual(first, prometheus(XDSL, IFCONFIG))
+        self.assertEqual("""zyxel_bytes{stream="rx",iface="br0"} """,
+                         renderer.prefixes["zyxel_bytes"]
+                         ["""{stream="rx",iface="br0"}"""])
+
+    def test_renderer_cache_limit(self):
+        renderer = Renderer(cache_size=5)
+        families = metric_families(parse_stats(None, IFCONFIG))
+
+        renderer.format_families(families)
+        self.assertIn("zyxel_bytes", renderer.prefixes)
+        renderer.format_families(families[:1])
+        self.assertEqual(["zyxel_up"], list(renderer.prefixes))
+
+    def test_parse_ifconfig_include(self):
+        ifaces = parse_ifconfig(IFCONFIG, include=re.compile(r"ppp.*|br0"))
+
+        self.assertEqual(["br0", "ppp2.3"], [iface.name for iface in ifaces])
+        self.assertEqual(2713281739, ifaces[0].rx_bytes)
+
+    def test_parse_ifconfig_exclude(self):
+        ifaces = parse_ifconfig(IFCONFIG, exclude=re.compile(r"eth.*"))
+        names = [iface.name for iface in ifaces]
+
+        self.assertIn("bcmsw", names)
+        self.assertNotIn("eth0", names)
+        self.assertNotIn("eth0.0", names)
+
+    def test_prometheus_include_exclude(self):
+        prom = prometheus(XDSL, IFCONFIG, include=re.compile(r"p.*"),
+                          exclude=re.compile(r"ptm0"))
+
+        self.assertIn('iface="ppp2.3"', prom)
+        self.assertIn('iface="ptm0.3"', prom)
+        self.assertNotIn('iface="ptm0"', prom)
+        self.assertNotIn('iface="br0"', prom)
+
+    def test_parse_net_dev(self):
+        ifaces = parse_net_dev(NET_DEV)
+        iface = [iface for iface in ifaces if iface.name == "ptm0"][0]
+
+        self.assertEqual(14, len(ifaces))
+        self.assertEqual(1456958071, iface.rx_bytes)
+        self.assertEqual(11518182, iface.rx_packets)
+        self.assertEqual(1, iface.rx_dropped)
+        self.assertEqual(2762154613, iface.tx_bytes)
+        self.assertEqual(3693, iface.tx_dropped)
+        self.assertEqual(0, iface.collisions)
+
+    def test_parse_net_dev_matches_ifconfig(self):
+        from_ifconfig = prometheus(None, IFCONFIG)
+        from_net_dev = prometheus(None, NET_DEV)
+
+        self.assertEqual(from_ifconfig, from_net_dev)
+
+    def test_parse_net_dev_include(self):
+        ifaces = parse_net_dev(NET_DEV, include=re.compile(r"ppp.*|br0"))
+
+        self.assertEqual(["br0", "ppp2.3"], [iface.name for iface in ifaces])
@@ -0,0 +1,100 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from unittest.mock import patch
+
+from zyxelprometheus.counters import WRAP_32
+from zyxelprometheus.model import InterfaceCounters
+from zyxelprometheus.prometheus import format_families
+from zyxelprometheus.sampler import Sampler
+
+
+def sampler_for(samples, window=15):
+    samples = iter(samples)
+
+    def sample():
+        rx_bytes = next(samples)
+        if rx_bytes is None:
+            return None
+        return [InterfaceCounters("ppp0", rx_bytes=rx_bytes, tx_bytes=0)]
+
+    return Sampler(sample, 1, window)
+
+
+def collect(sampler, times):
+    with patch("zyxelprometheus.sampler.time.monotonic",
+               side_effect=times):
+        for _ in times:
+            sampler.collect()
+
+
+class TestSampler(unittest.TestCase):
+    def test_min_max_avg(self):
+        sampler = sampler_for([0, 1000, 5000])
+        collect(sampler, [0, 1, 2])
+
+        output = format_families(sampler.families())
+
+        self.assertIn("""zyxel_throughput_min_bytes_per_second"""
+                      + """{stream="rx",iface="ppp0"} 1000.0""", output)
+        self.assertIn("""zyxel_throughput_max_bytes_per_second"""
+                      + """{stream="rx",iface="ppp0"} 4000.0""", output)
+        self.assertIn("""zyxel_throughput_avg_bytes_per_second"""
+                      + """{stream="rx",iface="ppp0"} 2500.0""", output)
+        self.assertIn("""zyxel_throughput_avg_bytes_per_second"""
+                      + """{stream="tx",iface="ppp0"} 0.0""", output)
+
+    def test_histogram(self):
+        sampler = sampler_for([0, 1000, 5000])
+        collect(sampler, [0, 1, 2])
+
+        output = format_families(sampler.families())
+
+        self.assertIn("""zyxel_throughput_bytes_per_second_bucket"""
+                      + """{stream="rx",iface="ppp0",le="1000.0"} 1""",
+                      output)
+        self.assertIn("""zyxel_throughput_bytes_per_second_bucket"""
+                      + """{stream="rx",iface="ppp0",le="4000.0"} 2""",
+                      output)
+        self.assertIn("""zyxel_throughput_bytes_per_second_count"""
+                      + """{stream="rx",iface="ppp0"} 2""", output)
+
+    def test_window(self):
+        sampler = sampler_for([0, 1000, 100000], window=15)
+        collect(sampler, [0, 1, 100])
+
+        output = format_families(sampler.families())
+
+        self.assertIn("""zyxel_throughput_max_bytes_per_second"""
+                      + """{stream="rx",iface="ppp0"} 1000.0""", output)
+        self.assertEqual(1, len(sampler.rates[("rx", "ppp0")]))
+
+    def test_router_unavailable(self):
+        sampler = sampler_for([0, None, 1000])
+        collect(sampler, [0, 1, 2])
+
+        self.assertEqual({}, sampler.rates)
+        self.assertNotIn("zyxel_throughput_min_bytes_per_second{",
+                         format_families(sampler.families()))
+
+    def test_wrap(self):
+        sampler = sampler_for([WRAP_32 - 500, 500])
+        collect(sampler, [0, 2])
+
+        self.assertIn("""zyxel_throughput_max_bytes_per_second"""
+                      + """{stream="rx",iface="ppp0"} 500.0""",
+                      format_families(sampler.families()))
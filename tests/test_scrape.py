@@ -17,12 +17,17 @@
 import json
 import unittest
 
-from zyxelprometheus import login, scrape_ifconfig, scrape_xdsl
+from zyxelprometheus import login, scrape_ifconfig, scrape_interfaces, \
+    scrape_xdsl, Shell
+
+from zyxelprometheus.instrumentation import TIMEOUTS
 
 from .mock_sshclient import MockSSHClient, MockSSHSession, MockHungSSHSession
 
 IFCONFIG = open("example_ifconfig.txt", "rb").read().decode("utf8")
+NET_DEV = open("example_net_dev.txt", "rb").read().decode("utf8")
 XDSL = open("example_xdsl.txt", "rb").read().decode("utf8")
+XDSL_STATS = open("example_xdsl_stats.txt", "rb").read().decode("utf8")
 
 
 class TestScrape(unittest.TestCase):
@@ -32,6 +37,7 @@ class TestScrape(unittest.TestCase):
         session = MockSSHSession()
         session.add_cmd("ifconfig\n", IFCONFIG)
         session.add_cmd("xdslctl info\n", XDSL)
+        session.add_cmd("xdslctl info --stats\n", XDSL_STATS)
         MockSSHClient.add_session("192.168.1.1",
                                   "admin",
                                   "testpassword",
@@ -46,6 +52,27 @@ class TestScrape(unittest.TestCase):
 
         self.assertTrue("192.168.1.1" in ifconfig)
 
+    def test_scrape_interfaces(self):
+        session = login("192.168.1.1",
+                        "admin",
+                        "testpassword")
+        session.current_session.add_cmd("cat /proc/net/dev\n", NET_DEV)
+
+        output = scrape_interfaces(session)
+
+        self.assertTrue(output.startswith("Inter-|"))
+
+    def test_scrape_interfaces_fallback(self):
+        session = login("192.168.1.1",
+                        "admin",
+                        "testpassword")
+        session.current_session.add_cmd("cat /proc/net/dev\n",
+                                        "cat: command not found\r\n")
+
+        output = scrape_interfaces(session)
+
+        self.assertTrue("192.168.1.1" in output)
+
     def test_scrape_xdsl(self):
         session = login("192.168.1.1",
                         "admin",
@@ -55,7 +82,67 @@ class TestScrape(unittest.TestCase):
 
         self.assertTrue("Status: Showtime" in xdsl)
 
+    def test_scrape_xdsl_stats(self):
+        session = login("192.168.1.1",
+                        "admin",
+                        "testpassword")
+
+        xdsl = scrape_xdsl(session, stats=True)
+
+        self.assertTrue("SNR (dB):" in xdsl)
+
+    def test_shell_reuses_channel(self):
+        session = login("192.168.1.1",
+                        "admin",
+                        "testpassword")
+        shell = Shell(session)
+
+        xdsl = scrape_xdsl(shell)
+        ifconfig = scrape_ifconfig(shell)
+
+        self.assertTrue("Status: Showtime" in xdsl)
+        self.assertTrue("192.168.1.1" in ifconfig)
+        self.assertEqual(1, session.exec_count)
+
+    def test_shell_reopens_dead_channel(self):
+        session = login("192.168.1.1",
+                        "admin",
+                        "testpassword")
+        shell = Shell(session)
+
+        scrape_xdsl(shell)
+        session.current_session.channel.close()
+        xdsl = scrape_xdsl(shell)
+
+        self.assertTrue("Status: Showtime" in xdsl)
+        self.assertEqual(2, session.exec_count)
+
+    def test_multibyte_output(self):
+        session = login("192.168.1.1",
+                        "admin",
+                        "testpassword")
+        session.current_session.add_cmd("ifconfig\n", "caf\u00e9\r\n")
+        session.current_session.read_size = 4
+
+        self.assertEqual("caf\u00e9\r\n", scrape_ifconfig(session))
+
+    def test_channel_closed(self):
+        session = login("192.168.1.1",
+                        "admin",
+                        "testpassword")
+        session.current_session.add_cmd("ifconfig\n", "br0 Link encap",
+                                        close=True)
+        shell = Shell(session)
+
+        self.assertRaises(EOFError, shell.execute, "ifconfig")
+        self.assertFalse(shell.is_open())
+
+        # The next command opens a new channel.
+        session.current_session.add_cmd("ifconfig\n", "lo Link encap\r\n")
+        self.assertEqual("lo Link encap\r\n", shell.execute("ifconfig"))
+
     def test_timeout(self):
+        timeouts = TIMEOUTS.family()[3][0][1]
         session = MockHungSSHSession()
         MockSSHClient.add_session("192.168.1.1",
                                   "admin",
@@ -66,4 +153,5 @@ class TestScrape(unittest.TestCase):
                         "admin",
                         "testpassword")
 
-        xdsl = scrape_xdsl(session)
+        self.assertRaises(TimeoutError, scrape_xdsl, session, timeout=0.5)
+        self.assertEqual(timeouts + 1, TIMEOUTS.family()[3][0][1])
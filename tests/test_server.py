@@ -14,22 +14,36 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import gzip
 import io
 import json
 from datetime import datetime, timedelta
+import os
+import tempfile
+import threading
+import time
 import unittest
 
-from zyxelprometheus.server import Handler, Scraper
+from zyxelprometheus import get_arguments
+from zyxelprometheus.instrumentation import RECONNECTS
+from zyxelprometheus.prometheus import format_families
+from zyxelprometheus.server import accepts_openmetrics, choose_encoding, \
+    Handler, Payload, ScheduledScraper, Scraper, ScraperPool
+from zyxelprometheus.sampler import Sampler
+from zyxelprometheus.spool import Spool
 
 from .mock_sshclient import MockSSHClient, MockSSHSession
 
 XDSL = open("example_xdsl.txt", "rb").read().decode("utf8")
 IFCONFIG = open("example_ifconfig.txt", "rb").read().decode("utf8")
+NET_DEV = open("example_net_dev.txt", "rb").read().decode("utf8")
+NO_NET_DEV = "cat: command not found\r\n"
 
 
 class MockHandler(Handler):
     def __init__(self):
         self.wfile = io.BytesIO()
+        self.headers = {}
         self.requestline = "GET"
         self.client_address = ("127.0.0.1", 8000)
         self.request_version = "1.0"
@@ -42,12 +56,27 @@ class TestServer(unittest.TestCase):
 
         session = MockSSHSession()
         session.add_cmd("ifconfig\n", IFCONFIG)
+        session.add_cmd("cat /proc/net/dev\n", NO_NET_DEV)
         session.add_cmd("xdslctl info\n", XDSL)
         MockSSHClient.add_session("192.168.1.1",
                                   "testuser",
                                   "testpassword",
                                   session)
 
+        session = MockSSHSession()
+        session.add_cmd("ifconfig\n", IFCONFIG)
+        session.add_cmd("cat /proc/net/dev\n", NO_NET_DEV)
+        session.add_cmd("xdslctl info\n", XDSL)
+        MockSSHClient.add_session("192.168.1.2",
+                                  "testuser",
+                                  "testpassword",
+                                  session)
+
+        self.args = get_arguments(["--host", "192.168.1.1",
+                                   "--user", "testuser",
+                                   "--passwd", "testpassword", "-d",
+                                   "--targets", "192.168.1.1,192.168.1.2"])
+
     def test_index(self):
         handler = MockHandler()
         handler.path = "/"
@@ -65,19 +94,689 @@ class TestServer(unittest.TestCase):
         self.assertTrue("404" in handler.wfile.read().decode("utf8"))
 
     def test_metrics(self):
-        class Args:
-            host = "192.168.1.1"
-            user = "testuser"
-            passwd = "testpassword"
-            ifconfig_only = False
-            xdsl_only = False
+        MockHandler.scraper = Scraper(self.args)
+
+        handler = MockHandler()
+        handler.path = "/metrics"
+        handler.do_GET()
+
+        handler.wfile.seek(0)
+        self.assertTrue(
+            "zyxel_line_rate" in handler.wfile.read().decode("utf8"))
+
+    def test_exporter_metrics(self):
+        MockHandler.scraper = Scraper(self.args)
+        MockHandler.pool = ScraperPool(self.args, 10)
+
+        handler = MockHandler()
+        handler.path = "/metrics"
+        handler.do_GET()
+        handler.wfile.seek(0)
+        response = handler.wfile.read().decode("utf8")
+
+        self.assertIn("""zyxel_exporter_command_seconds_count{"""
+                      + """command="ifconfig"}""", response)
+        self.assertIn("zyxel_exporter_login_seconds_count", response)
+        self.assertIn("zyxel_exporter_parse_seconds_count", response)
+
+        handler = MockHandler()
+        handler.path = "/probe?target=192.168.1.2"
+        handler.do_GET()
+        handler.wfile.seek(0)
+        response = handler.wfile.read().decode("utf8")
 
-        MockHandler.scraper = Scraper(Args())
+        self.assertIn("zyxel_line_rate", response)
+        self.assertNotIn("zyxel_exporter_command_seconds", response)
+
+    def test_metrics_content_type(self):
+        MockHandler.scraper = Scraper(self.args)
 
         handler = MockHandler()
         handler.path = "/metrics"
         handler.do_GET()
 
+        handler.wfile.seek(0)
+        response = handler.wfile.read().decode("utf8")
+        self.assertIn("Content-Type: text/plain; version=0.0.4", response)
+        self.assertNotIn("# EOF", response)
+
+    def test_metrics_openmetrics(self):
+        MockHandler.scraper = Scraper(self.args)
+
+        handler = MockHandler()
+        handler.path = "/metrics"
+        handler.headers["Accept"] = \
+            "application/openmetrics-text;version=1.0.0," \
+            + "text/plain;version=0.0.4;q=0.5,*/*;q=0.1"
+        handler.do_GET()
+
+        handler.wfile.seek(0)
+        response = handler.wfile.read().decode("utf8")
+        self.assertIn("Content-Type: application/openmetrics-text", response)
+        self.assertIn("# TYPE zyxel_exporter_coalesced_scrapes counter",
+                      response)
+        self.assertIn("zyxel_exporter_coalesced_scrapes_total 0", response)
+        self.assertIn("""zyxel_bytes_total{stream="rx",iface="br0"}""",
+                      response)
+        self.assertTrue(response.endswith("# EOF\n"))
+
+    def test_metrics_gzip(self):
+        MockHandler.scraper = Scraper(self.args)
+
+        handler = MockHandler()
+        handler.path = "/metrics"
+        handler.headers["Accept-Encoding"] = "gzip, deflate"
+        handler.do_GET()
+
+        handler.wfile.seek(0)
+        headers, body = handler.wfile.read().split(b"\r\n\r\n", 1)
+        self.assertIn(b"Content-Encoding: gzip", headers)
+        self.assertIn(f"Content-Length: {len(body)}".encode("utf8"),
+                      headers)
+        self.assertIn(b"zyxel_line_rate", gzip.decompress(body))
+
+    def test_payload_caches_bodies(self):
+        payload = Payload(Scraper(self.args).families())
+
+        body = payload.body(False, "gzip")
+
+        self.assertIs(body, payload.body(False, "gzip"))
+        self.assertEqual(payload.body(False), gzip.decompress(body))
+        self.assertNotEqual(payload.body(False), payload.body(True))
+
+    def test_choose_encoding(self):
+        self.assertIsNone(choose_encoding(None))
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertEqual("gzip", choose_encoding("gzip, deflate"))
+        self.assertEqual("deflate", choose_encoding("gzip;q=0.5, deflate"))
+        self.assertEqual("gzip", choose_encoding("*"))
+        self.assertIsNone(choose_encoding("gzip;q=0"))
+
+    def test_accepts_openmetrics(self):
+        self.assertFalse(accepts_openmetrics(None))
+        self.assertFalse(accepts_openmetrics("text/plain;version=0.0.4"))
+        self.assertTrue(accepts_openmetrics(
+            "application/openmetrics-text;version=1.0.0,"
+            + "application/openmetrics-text;version=0.0.1;q=0.75,"
+            + "text/plain;version=0.0.4;q=0.5,*/*;q=0.1"))
+        self.assertFalse(accepts_openmetrics(
+            "application/openmetrics-text;q=0.2,text/plain"))
+
+    def test_scraper_reuses_shell(self):
+        scraper = Scraper(self.args)
+
+        scraper.scrape()
+        stats = scraper.scrape()
+
+        self.assertEqual("Showtime", stats.xdsl.status)
+        self.assertIn("br0", [iface.name for iface in stats.interfaces])
+        # One channel for each command, which are kept open between scrapes.
+        self.assertEqual(2, scraper.session.exec_count)
+
+    def test_scraper_counters_wrap(self):
+        scraper = Scraper(self.args)
+        scraper.scrape()
+
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        session.add_cmd("ifconfig\n", IFCONFIG.replace(
+            "RX bytes:2713281739", "RX bytes:1000", 1))
+        stats = scraper.scrape()
+
+        iface = [iface for iface in stats.interfaces
+                 if iface.name == "br0"][0]
+        self.assertEqual(2 ** 32 + 1000, iface.rx_bytes)
+        self.assertIn("zyxel_exporter_counter_wraps_total 1",
+                      format_families(scraper.families()))
+
+    def test_scraper_counters_reset_after_reboot(self):
+        scraper = Scraper(self.args)
+        scraper.scrape()
+
+        # The router reboots, dropping the connection.
+        scraper.session.transport.active = False
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        session.add_cmd("ifconfig\n", IFCONFIG.replace(
+            "RX bytes:2713281739", "RX bytes:5000000", 1))
+        stats = scraper.scrape()
+
+        iface = [iface for iface in stats.interfaces
+                 if iface.name == "br0"][0]
+        self.assertEqual(2713281739 + 5000000, iface.rx_bytes)
+        families = format_families(scraper.families())
+        self.assertIn("zyxel_exporter_counter_wraps_total 0", families)
+        self.assertIn("zyxel_exporter_counter_resets_total 1", families)
+
+    def test_scraper_iface_filter(self):
+        args = get_arguments(["--host", "192.168.1.1",
+                              "--user", "testuser",
+                              "--passwd", "testpassword",
+                              "--iface-include", "ppp.*"])
+
+        stats = Scraper(args).scrape()
+
+        self.assertEqual(["ppp2.3"],
+                         [iface.name for iface in stats.interfaces])
+
+    def test_scraper_net_dev(self):
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        session.add_cmd("cat /proc/net/dev\n", NET_DEV)
+        session.add_cmd("ifconfig\n", "")
+        scraper = Scraper(self.args)
+
+        stats = scraper.scrape()
+
+        iface = [iface for iface in stats.interfaces
+                 if iface.name == "br0"][0]
+        self.assertEqual(2713281739, iface.rx_bytes)
+        self.assertEqual(19510, iface.rx_dropped)
+        self.assertTrue(scraper.net_dev)
+
+    def test_scraper_net_dev_fallback(self):
+        scraper = Scraper(self.args)
+
+        stats = scraper.scrape()
+
+        self.assertIn("br0", [iface.name for iface in stats.interfaces])
+        self.assertFalse(scraper.net_dev)
+
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        del session.cmds["cat /proc/net/dev\n"]
+        self.assertTrue(scraper.scrape().up)
+
+    def test_scraper_net_dev_empty(self):
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        session.add_cmd("cat /proc/net/dev\n", "")
+        scraper = Scraper(self.args)
+
+        stats = scraper.scrape()
+
+        self.assertIn("br0", [iface.name for iface in stats.interfaces])
+        self.assertTrue(scraper.net_dev)
+
+        # The next scrape tries /proc/net/dev again, so doesn't need
+        # ifconfig.
+        session.add_cmd("cat /proc/net/dev\n", NET_DEV)
+        del session.cmds["ifconfig\n"]
+        self.assertTrue(scraper.scrape().up)
+
+    def test_scraper_use_ifconfig(self):
+        args = get_arguments(["--host", "192.168.1.1",
+                              "--user", "testuser",
+                              "--passwd", "testpassword",
+                              "--use-ifconfig"])
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        del session.cmds["cat /proc/net/dev\n"]
+
+        stats = Scraper(args).scrape()
+
+        self.assertTrue(stats.up)
+        self.assertIn("br0", [iface.name for iface in stats.interfaces])
+
+    def test_commands_run_in_parallel(self):
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        session.add_cmd("xdslctl info\n", XDSL, delay=0.3)
+        session.add_cmd("ifconfig\n", IFCONFIG, delay=0.3)
+        scraper = Scraper(self.args)
+
+        started = time.monotonic()
+        stats = scraper.scrape()
+
+        self.assertLess(time.monotonic() - started, 0.55)
+        self.assertEqual("Showtime", stats.xdsl.status)
+        self.assertIn("br0", [iface.name for iface in stats.interfaces])
+        scraper.close()
+
+    def test_scrape_timeout(self):
+        args = get_arguments(["--host", "192.168.1.1",
+                              "--user", "testuser",
+                              "--passwd", "testpassword",
+                              "--scrape-timeout", "0.1"])
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        session.add_cmd("ifconfig\n", IFCONFIG, delay=0.5)
+        scraper = Scraper(args)
+
+        started = time.monotonic()
+        stats = scraper.scrape()
+
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertFalse(stats.up)
+        self.assertIsNone(scraper.session)
+        scraper.close()
+
+    def test_command_timeout(self):
+        args = get_arguments(["--host", "192.168.1.1",
+                              "--user", "testuser",
+                              "--passwd", "testpassword",
+                              "--timeout", "0.2",
+                              "--scrape-timeout", "5"])
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        session.add_cmd("ifconfig\n", None)
+        scraper = Scraper(args)
+
+        output = format_families(scraper.families())
+
+        self.assertIn("zyxel_up 0", output)
+        self.assertNotIn("zyxel_line_rate", output)
+        self.assertIsNone(scraper.session)
+        scraper.close()
+
+    def test_scrape_timeout_includes_login(self):
+        args = get_arguments(["--host", "192.168.1.1",
+                              "--user", "testuser",
+                              "--passwd", "testpassword",
+                              "--timeout", "5",
+                              "--scrape-timeout", "0.9"])
+        scraper = Scraper(args)
+
+        self.assertTrue(scraper.scrape().up)
+
+        self.assertLessEqual(scraper.session.connect_kwargs["timeout"], 0.3)
+        scraper.close()
+
+    def test_scrape_timeout_includes_waiting(self):
+        args = get_arguments(["--host", "192.168.1.1",
+                              "--user", "testuser",
+                              "--passwd", "testpassword",
+                              "--scrape-timeout", "0.1"])
+        scraper = Scraper(args)
+
+        # Something else, like the sampler, is using the session.
+        with scraper.lock:
+            started = time.monotonic()
+            stats = scraper.scrape()
+
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertFalse(stats.up)
+        scraper.close()
+
+    def test_sample_interfaces(self):
+        scraper = Scraper(self.args)
+        sampler = Sampler(scraper.sample_interfaces, 1, 15)
+        scraper.sampler = sampler
+        sampler.collect()
+        sampler.collect()
+
+        self.assertIn(("rx", "br0"), sampler.rates)
+        self.assertIn("zyxel_throughput_avg_bytes_per_second{",
+                      format_families(scraper.families()))
+        # The samples share the scraper's session.
+        self.assertEqual(2, scraper.session.exec_count)
+        scraper.close()
+
+    def test_concurrent_scrapes(self):
+        scraper = Scraper(self.args)
+        results = []
+
+        def scrape():
+            results.append(scraper.scrape())
+
+        threads = [threading.Thread(target=scrape) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(4, len(results))
+        for stats in results:
+            self.assertEqual("Showtime", stats.xdsl.status)
+            self.assertIn("br0", [iface.name for iface in stats.interfaces])
+        # One channel for each command, which are kept open between scrapes.
+        self.assertEqual(2, scraper.session.exec_count)
+
+    def test_coalesce_scrapes(self):
+        scraper = Scraper(self.args)
+        release = threading.Event()
+        calls = []
+
+        def slow_scrape():
+            calls.append(1)
+            release.wait(5)
+            return "xdsl", "ifconfig"
+
+        scraper._scrape = slow_scrape
+        results = []
+
+        def scrape():
+            results.append(scraper.scrape())
+
+        threads = [threading.Thread(target=scrape) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while scraper.coalesced < 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual([("xdsl", "ifconfig")] * 3, results)
+        self.assertIn("zyxel_exporter_coalesced_scrapes_total 2",
+                      format_families(scraper.exporter_metrics()))
+
+    def test_scrape_error_not_cached(self):
+        scraper = Scraper(self.args)
+
+        def broken_scrape():
+            raise ValueError("broken")
+
+        scraper._scrape = broken_scrape
+        self.assertRaises(ValueError, scraper.scrape)
+        self.assertIsNone(scraper.flight)
+
+        del scraper._scrape
+        stats = scraper.scrape()
+        self.assertEqual("Showtime", stats.xdsl.status)
+
+    def test_scheduled_metrics(self):
+        scraper = ScheduledScraper(Scraper(self.args), 15, 45)
+        scraper.collect()
+        MockHandler.scraper = scraper
+
+        handler = MockHandler()
+        handler.path = "/metrics"
+        handler.do_GET()
+
+        handler.wfile.seek(0)
+        payload = handler.wfile.read().decode("utf8")
+        self.assertTrue("zyxel_line_rate" in payload)
+        self.assertTrue(
+            "zyxel_exporter_last_scrape_timestamp_seconds" in payload)
+
+    def test_scheduled_spool(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            spool = Spool(os.path.join(tmpdir, "router.spool"), 1024 * 1024)
+            scraper = ScheduledScraper(Scraper(self.args), 15, 45, spool)
+            scraper.collect()
+            scraper.collect()
+
+            records = spool.records()
+            self.assertEqual(2, len(records))
+            self.assertIn("zyxel_line_rate",
+                          [family[0] for family in records[0][1]])
+
+            MockHandler.spool = spool
+            handler = MockHandler()
+            handler.path = f"/backfill?since={records[0][0]}"
+            handler.do_GET()
+            MockHandler.spool = None
+            scraper.close()
+
+        handler.wfile.seek(0)
+        response = handler.wfile.read().decode("utf8")
+        self.assertIn("application/openmetrics-text", response)
+        self.assertEqual(1, response.count(
+            "\nzyxel_exporter_last_scrape_timestamp_seconds "))
+        self.assertIn(f"zyxel_up 1 {records[1][0]:.3f}", response)
+
+    def test_backfill_limit(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            spool = Spool(os.path.join(tmpdir, "router.spool"), 1024 * 1024)
+            for timestamp in (1000.0, 1005.0, 1010.0):
+                spool.append(timestamp, [("zyxel_up", "gauge", "Up.",
+                                          [("", 1)])])
+
+            MockHandler.spool = spool
+            handler = MockHandler()
+            handler.path = "/backfill?since=999&limit=2"
+            handler.headers = {"Accept-Encoding": "gzip"}
+            handler.do_GET()
+            MockHandler.spool = None
+            spool.close()
+
+        handler.wfile.seek(0)
+        headers, body = handler.wfile.read().split(b"\r\n\r\n", 1)
+        self.assertIn(b"X-Backfill-Next-Since: 1005.000", headers)
+        self.assertNotIn(b"Content-Length", headers)
+        self.assertEqual("# HELP zyxel_up Up.\n# TYPE zyxel_up gauge\n"
+                         + "zyxel_up 1 1000.000\nzyxel_up 1 1005.000\n"
+                         + "# EOF\n", gzip.decompress(body).decode("utf8"))
+
+    def test_backfill_invalid_limit(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            MockHandler.spool = Spool(os.path.join(tmpdir, "router.spool"),
+                                      1024 * 1024)
+            handler = MockHandler()
+            handler.path = "/backfill?limit=100000"
+            handler.do_GET()
+            MockHandler.spool.close()
+            MockHandler.spool = None
+
+        handler.wfile.seek(0)
+        self.assertIn("400", handler.wfile.read().decode("utf8"))
+
+    def test_backfill_without_spool(self):
+        handler = MockHandler()
+        handler.path = "/backfill"
+        handler.do_GET()
+
+        handler.wfile.seek(0)
+        self.assertIn("404", handler.wfile.read().decode("utf8"))
+
+    def test_backfill_invalid_since(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            MockHandler.spool = Spool(os.path.join(tmpdir, "router.spool"),
+                                      1024 * 1024)
+            handler = MockHandler()
+            handler.path = "/backfill?since=yesterday"
+            handler.do_GET()
+            MockHandler.spool.close()
+            MockHandler.spool = None
+
+        handler.wfile.seek(0)
+        self.assertIn("400", handler.wfile.read().decode("utf8"))
+
+    def test_scheduled_metrics_stale(self):
+        scraper = ScheduledScraper(Scraper(self.args), 15, 45)
+        MockHandler.scraper = scraper
+
+        handler = MockHandler()
+        handler.path = "/metrics"
+        handler.do_GET()
+        handler.wfile.seek(0)
+        self.assertTrue("503" in handler.wfile.read().decode("utf8"))
+
+        scraper.collect()
+        scraper.scraped_at -= 60
+
+        handler = MockHandler()
+        handler.path = "/metrics"
+        handler.do_GET()
+        handler.wfile.seek(0)
+        self.assertTrue("503" in handler.wfile.read().decode("utf8"))
+
+    def test_scheduled_scraper_thread(self):
+        scraper = ScheduledScraper(Scraper(self.args), 0.01, 45)
+        scraper.start()
+        while scraper.latest is None:
+            time.sleep(0.01)
+        session = scraper.scraper.session
+
+        scraper.close()
+
+        self.assertFalse(scraper.thread.is_alive())
+        self.assertIsNone(session.current_session)
+
+    def test_close_logs_out(self):
+        scraper = Scraper(self.args)
+        scraper.scrape()
+        session = scraper.session
+
+        scraper.close()
+
+        self.assertIsNone(scraper.session)
+        self.assertIsNone(session.current_session)
+
+    def test_reconnect_counted(self):
+        reconnects = RECONNECTS.family()[3][0][1]
+        scraper = Scraper(self.args)
+        scraper.scrape()
+        self.assertEqual(reconnects, RECONNECTS.family()[3][0][1])
+
+        scraper.close()
+        scraper.scrape()
+
+        self.assertEqual(reconnects + 1, RECONNECTS.family()[3][0][1])
+
+    def test_reconnect_after_connection_dropped(self):
+        reconnects = RECONNECTS.family()[3][0][1]
+        scraper = Scraper(self.args)
+        scraper.scrape()
+        old_session = scraper.session
+
+        old_session.transport.active = False
+        stats = scraper.scrape()
+
+        self.assertTrue(stats.up)
+        self.assertEqual("Showtime", stats.xdsl.status)
+        self.assertIsNot(old_session, scraper.session)
+        self.assertEqual(reconnects + 1, RECONNECTS.family()[3][0][1])
+
+    def test_login_failure_backs_off(self):
+        scraper = Scraper(self.args, "192.168.1.3")
+
+        stats = scraper.scrape()
+
+        self.assertFalse(stats.up)
+        self.assertEqual(1, scraper.failures)
+        self.assertGreater(scraper.next_attempt, time.monotonic())
+        self.assertIn("zyxel_up 0", format_families(scraper.families()))
+
+        # Still backing off, so no login is attempted.
+        self.assertFalse(scraper.scrape().up)
+        self.assertEqual(1, scraper.failures)
+
+        scraper.next_attempt = 0
+        started = time.monotonic()
+        self.assertFalse(scraper.scrape().up)
+        self.assertEqual(2, scraper.failures)
+        self.assertGreaterEqual(scraper.next_attempt, started + 1)
+        self.assertLessEqual(scraper.next_attempt, time.monotonic() + 2)
+
+    def test_channel_closed_during_command(self):
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        session.add_cmd("ifconfig\n", IFCONFIG[:len(IFCONFIG) // 3],
+                        close=True)
+        scraper = Scraper(self.args)
+
+        output = format_families(scraper.families())
+
+        self.assertIn("zyxel_up 0", output)
+        self.assertNotIn("zyxel_bytes", output)
+        self.assertIsNone(scraper.session)
+        scraper.close()
+
+    def test_command_failure_backs_off(self):
+        args = get_arguments(["--host", "192.168.1.1",
+                              "--user", "testuser",
+                              "--passwd", "testpassword",
+                              "--timeout", "0.1"])
+        session = MockSSHClient.mock_sessions[("192.168.1.1", "testuser",
+                                               "testpassword")]
+        session.add_cmd("xdslctl info\n", None)
+        scraper = Scraper(args)
+
+        for _ in range(5):
+            self.assertFalse(scraper.scrape().up)
+
+        self.assertEqual(1, MockSSHClient.connections)
+        self.assertEqual(1, scraper.failures)
+        self.assertGreater(scraper.next_attempt, time.monotonic())
+
+        # Once the router answers again the failures are forgotten.
+        session.add_cmd("xdslctl info\n", XDSL)
+        scraper.next_attempt = 0
+        self.assertTrue(scraper.scrape().up)
+        self.assertEqual(0, scraper.failures)
+        scraper.close()
+
+    def test_up(self):
+        scraper = Scraper(self.args)
+
+        self.assertIn("zyxel_up 1", format_families(scraper.families()))
+
+    def test_probe(self):
+        MockHandler.pool = ScraperPool(self.args, 10)
+
+        handler = MockHandler()
+        handler.path = "/probe?target=192.168.1.2"
+        handler.do_GET()
+
         handler.wfile.seek(0)
         self.assertTrue(
             "zyxel_line_rate" in handler.wfile.read().decode("utf8"))
+        self.assertEqual([("192.168.1.2", "testuser")],
+                         list(MockHandler.pool.scrapers.keys()))
+        self.assertEqual({}, MockHandler.pool.leases)
+
+    def test_probe_without_target(self):
+        MockHandler.pool = ScraperPool(self.args, 10)
+
+        handler = MockHandler()
+        handler.path = "/probe"
+        handler.do_GET()
+
+        handler.wfile.seek(0)
+        self.assertTrue("400" in handler.wfile.read().decode("utf8"))
+
+    def test_probe_unknown_target(self):
+        MockHandler.pool = ScraperPool(self.args, 10)
+
+        handler = MockHandler()
+        handler.path = "/probe?target=attacker.example"
+        handler.do_GET()
+
+        handler.wfile.seek(0)
+        self.assertTrue("403" in handler.wfile.read().decode("utf8"))
+        self.assertEqual(0, len(MockHandler.pool.scrapers))
+
+    def test_pool_evicts_least_recently_used(self):
+        pool = ScraperPool(self.args, 1)
+
+        with pool.lease("192.168.1.1") as first:
+            first.scrape()
+        with pool.lease("192.168.1.1") as scraper:
+            self.assertIs(first, scraper)
+
+        with pool.lease("192.168.1.2") as second:
+            second.scrape()
+
+        self.assertIsNone(first.session)
+        self.assertIsNotNone(second.session)
+        self.assertEqual([("192.168.1.2", "testuser")],
+                         list(pool.scrapers.keys()))
+
+    def test_pool_evicts_leased_scraper_after_use(self):
+        pool = ScraperPool(self.args, 1)
+
+        with pool.lease("192.168.1.1") as first:
+            # Another request evicts the scraper while it's being used.
+            with pool.lease("192.168.1.2") as second:
+                second.scrape()
+            first.scrape()
+            self.assertIsNotNone(first.session)
+
+        self.assertIsNone(first.session)
+        self.assertIsNone(first.executor)
+        self.assertIsNotNone(second.session)
+        self.assertEqual({}, pool.leases)
+        self.assertEqual(set(), pool.retired)
+
+    def test_pool_close(self):
+        pool = ScraperPool(self.args, 10)
+        with pool.lease("192.168.1.1") as scraper:
+            scraper.scrape()
+
+        pool.close()
+
+        self.assertIsNone(scraper.session)
+        self.assertEqual(0, len(pool.scrapers))
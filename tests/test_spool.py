@@ -0,0 +1,214 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+
+from zyxelprometheus.spool import backfill_chunks, format_backfill, \
+    SLOT_HEADER, SLOT_SIZE, Spool, spool_filename
+
+FAMILIES = [
+    ("zyxel_up", "gauge", "Whether the router could be scraped.",
+     [("", 1)]),
+    ("zyxel_bytes", "counter", "Bytes sent/received.",
+     [("""{stream="rx",iface="br0"}""", 2713281739),
+      ("""{stream="tx",iface="br0"}""", 1342943018)]),
+]
+
+
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "router.spool")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_append_and_read(self):
+        spool = Spool(self.filename, 1024 * 1024)
+        spool.append(1000.0, FAMILIES)
+        spool.append(1005.0, FAMILIES)
+
+        records = spool.records()
+
+        self.assertEqual([1000.0, 1005.0], [r[0] for r in records])
+        self.assertEqual("zyxel_bytes", records[0][1][1][0])
+        self.assertEqual(2713281739, records[0][1][1][3][0][1])
+        spool.close()
+
+    def test_since(self):
+        spool = Spool(self.filename, 1024 * 1024)
+        for timestamp in (1000.0, 1005.0, 1010.0):
+            spool.append(timestamp, FAMILIES)
+
+        self.assertEqual([1010.0], [r[0] for r in spool.records(1005.0)])
+        spool.close()
+
+    def test_persistent(self):
+        spool = Spool(self.filename, 1024 * 1024)
+        spool.append(1000.0, FAMILIES)
+        spool.close()
+
+        spool = Spool(self.filename, 1024 * 1024)
+        spool.append(1005.0, FAMILIES)
+
+        self.assertEqual([1000.0, 1005.0], [r[0] for r in spool.records()])
+        spool.close()
+
+    def test_different_size_starts_again(self):
+        spool = Spool(self.filename, 1024 * 1024)
+        spool.append(1000.0, FAMILIES)
+        spool.close()
+
+        spool = Spool(self.filename, 512 * 1024)
+
+        self.assertEqual([], spool.records())
+        spool.close()
+
+    def test_bounded(self):
+        spool = Spool(self.filename, SLOT_SIZE * 8)
+        for timestamp in range(20):
+            spool.append(float(timestamp), FAMILIES)
+
+        self.assertLessEqual(os.path.getsize(self.filename), SLOT_SIZE * 8)
+        timestamps = [r[0] for r in spool.records()]
+        self.assertEqual(list(map(float, range(20 - len(timestamps), 20))),
+                         timestamps)
+        spool.close()
+
+    def test_large_record(self):
+        families = [("zyxel_bytes", "counter", "Bytes sent/received.",
+                     [(f"""{{stream="rx",iface="eth{index}"}}""",
+                       os.urandom(4).hex()) for index in range(1000)])]
+        spool = Spool(self.filename, SLOT_SIZE * 64)
+        spool.append(1000.0, FAMILIES)
+        spool.append(1005.0, families)
+
+        records = spool.records()
+
+        self.assertEqual([1000.0, 1005.0], [r[0] for r in records])
+        self.assertEqual(1000, len(records[1][1][0][3]))
+        spool.close()
+
+    def test_corrupt_record_skipped(self):
+        spool = Spool(self.filename, 1024 * 1024)
+        spool.append(1000.0, FAMILIES)
+        spool.append(1005.0, FAMILIES)
+        spool.mmap[spool._offset(0) + SLOT_HEADER.size + 10] ^= 0xff
+
+        self.assertEqual([1005.0], [r[0] for r in spool.records()])
+        spool.close()
+
+    def test_format_backfill_histogram(self):
+        def histogram(count):
+            samples = []
+            for iface in ("br0", "eth0"):
+                labels = f'stream="rx",iface="{iface}"'
+                samples += [(f'_bucket{{{labels},le="1000.0"}}', count),
+                            (f'_bucket{{{labels},le="+Inf"}}', count),
+                            (f"_sum{{{labels}}}", count * 10),
+                            (f"_count{{{labels}}}", count)]
+            return [("zyxel_throughput_bytes_per_second", "histogram",
+                     "Throughput.", samples)]
+
+        backfill = format_backfill([(1000.0, histogram(1)),
+                                    (1005.0, histogram(2))])
+
+        # Each point's buckets, sum and count are together, in timestamp
+        # order, for one series at a time.
+        lines = [line.split(" ", 1)[0].split("{")[0] + " " + line.split()[-1]
+                 for line in backfill.splitlines()
+                 if not line.startswith("#")]
+        self.assertEqual(
+            ["zyxel_throughput_bytes_per_second_bucket 1000.000",
+             "zyxel_throughput_bytes_per_second_bucket 1000.000",
+             "zyxel_throughput_bytes_per_second_sum 1000.000",
+             "zyxel_throughput_bytes_per_second_count 1000.000",
+             "zyxel_throughput_bytes_per_second_bucket 1005.000",
+             "zyxel_throughput_bytes_per_second_bucket 1005.000",
+             "zyxel_throughput_bytes_per_second_sum 1005.000",
+             "zyxel_throughput_bytes_per_second_count 1005.000"] * 2,
+            lines)
+        self.assertLess(backfill.index('iface="br0",le="+Inf"} 2 1005.000'),
+                        backfill.index('iface="eth0",le="1000.0"} 1 1000'))
+
+    def test_format_backfill_unlabelled_histogram(self):
+        family = ("zyxel_exporter_login_seconds", "histogram", "Login.",
+                  [("""_bucket{le="+Inf"}""", 1), ("_sum", 0.5),
+                   ("_count", 1)])
+        backfill = format_backfill([(1000.0, [family]), (1005.0, [family])])
+
+        self.assertIn("""zyxel_exporter_login_seconds_bucket{le="+Inf"} 1 """
+                      + "1000.000\n"
+                      + "zyxel_exporter_login_seconds_sum 0.5 1000.000\n"
+                      + "zyxel_exporter_login_seconds_count 1 1000.000\n"
+                      + """zyxel_exporter_login_seconds_bucket{le="+Inf"} """
+                      + "1 1005.000\n", backfill)
+
+    def test_slots_fit_records(self):
+        spool = Spool(self.filename, 1024 * 1024)
+        spool.append(1000.0, FAMILIES)
+
+        # A small record only takes up one small slot.
+        self.assertEqual(1, spool.slot)
+        self.assertLessEqual(SLOT_SIZE, 512)
+        spool.close()
+
+    def test_index(self):
+        spool = Spool(self.filename, 1024 * 1024)
+        for timestamp in (1000.0, 1005.0, 1010.0):
+            spool.append(timestamp, FAMILIES)
+
+        entries = spool.index(1000.0)
+
+        self.assertEqual([1005.0, 1010.0], [entry[1] for entry in entries])
+        self.assertEqual(FAMILIES[1][0], spool.read(entries[0])[1][0])
+        spool.close()
+
+    def test_backfill_in_several_passes(self):
+        records = [(1000.0 + index, FAMILIES) for index in range(10)]
+        reads = []
+
+        def read_records():
+            reads.append(1)
+            return iter(records)
+
+        # Only one family fits in memory at a time, so the records are
+        # read once for each family.
+        chunks = list(backfill_chunks(read_records, len(records),
+                                      max_samples=10))
+
+        self.assertEqual(2, len(reads))
+        self.assertEqual(format_backfill(records), "".join(chunks))
+        self.assertEqual(["# TYPE zyxel_up gauge",
+                          "# TYPE zyxel_bytes counter", ""],
+                         [chunk.split("\n")[1] for chunk in chunks])
+
+    def test_spool_filename(self):
+        self.assertEqual(os.path.join("spool", "fe80__1.spool"),
+                         spool_filename("spool", "fe80::1"))
+
+    def test_format_backfill(self):
+        backfill = format_backfill([(1000.0, FAMILIES), (1005.0, FAMILIES)])
+
+        self.assertEqual(1, backfill.count("# TYPE zyxel_bytes counter"))
+        self.assertIn("""zyxel_bytes_total{stream="rx",iface="br0"} """
+                      + """2713281739 1000.000\n"""
+                      + """zyxel_bytes_total{stream="rx",iface="br0"} """
+                      + """2713281739 1005.000\n""", backfill)
+        self.assertIn("zyxel_up 1 1005.000\n", backfill)
+        self.assertTrue(backfill.endswith("# EOF\n"))
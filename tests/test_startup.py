@@ -0,0 +1,63 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def imported_modules(*args):
+    # -X importtime writes a line to stderr for every module imported, with
+    # the cumulative time in microseconds in the second column.
+    result = subprocess.run([sys.executable, "-X", "importtime"] + list(args),
+                            cwd=ROOT, env={"PYTHONPATH": ROOT},
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_is_light(self):
+        modules = imported_modules("-c", "import zyxelprometheus")
+
+        self.assertIn("zyxelprometheus", modules)
+        self.assertNotIn("paramiko", modules)
+        self.assertNotIn("http.server", modules)
+
+    def test_one_shot_does_not_load_server(self):
+        modules = imported_modules(os.path.join(ROOT, "bin",
+                                                "zyxelprometheus"))
+
+        # No password was given, so this stops before logging in.
+        self.assertIn("zyxelprometheus.arguments", modules)
+        self.assertNotIn("paramiko", modules)
+        self.assertNotIn("http.server", modules)
+
+    def test_serve_loads_server(self):
+        modules = imported_modules("-c", "from zyxelprometheus import serve")
+
+        self.assertIn("http.server", modules)
+        self.assertNotIn("paramiko", modules)
@@ -0,0 +1,107 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import stat
+import tempfile
+import unittest
+
+from zyxelprometheus import get_arguments
+from zyxelprometheus.textfile import textfile_name, TextfileWriter, \
+    with_label, write_atomic
+
+from .mock_sshclient import MockSSHClient, MockSSHSession
+
+XDSL = open("example_xdsl.txt", "rb").read().decode("utf8")
+IFCONFIG = open("example_ifconfig.txt", "rb").read().decode("utf8")
+
+
+class TestTextfile(unittest.TestCase):
+    def setUp(self):
+        MockSSHClient.reset()
+
+        for host in ("192.168.1.1", "192.168.1.2"):
+            session = MockSSHSession()
+            session.add_cmd("ifconfig\n", IFCONFIG)
+            session.add_cmd("cat /proc/net/dev\n", "cat: not found\r\n")
+            session.add_cmd("xdslctl info\n", XDSL)
+            MockSSHClient.add_session(host, "testuser", "testpassword",
+                                      session)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_with_label(self):
+        families = with_label([
+            ("zyxel_up", "gauge", "Up.", [("", 1)]),
+            ("zyxel_bytes", "counter", "Bytes.",
+             [("""{stream="rx",iface="br0"}""", 2)]),
+            ("zyxel_seconds", "histogram", "Seconds.",
+             [("""_bucket{le="+Inf"}""", 3), ("_sum", 4)]),
+        ], "router", "192.168.1.1")
+
+        self.assertEqual("""{router="192.168.1.1"}""", families[0][3][0][0])
+        self.assertEqual("""{router="192.168.1.1",stream="rx",iface="br0"}""",
+                         families[1][3][0][0])
+        self.assertEqual("""_bucket{router="192.168.1.1",le="+Inf"}""",
+                         families[2][3][0][0])
+        self.assertEqual("""_sum{router="192.168.1.1"}""",
+                         families[2][3][1][0])
+
+    def test_write_atomic(self):
+        filename = os.path.join(self.tmpdir.name, "zyxel.prom")
+        write_atomic(filename, "old\n")
+        write_atomic(filename, "new\n")
+
+        self.assertEqual(["zyxel.prom"], os.listdir(self.tmpdir.name))
+        self.assertEqual("new\n", open(filename).read())
+        self.assertEqual(0o644, stat.S_IMODE(os.stat(filename).st_mode))
+
+    def test_textfile_name(self):
+        self.assertEqual(os.path.join("dir", "zyxel_fe80__1.prom"),
+                         textfile_name("dir", "fe80::1"))
+
+    def test_writer(self):
+        args = get_arguments(["--user", "testuser",
+                              "--passwd", "testpassword",
+                              "--textfile-dir", self.tmpdir.name,
+                              "--targets", "192.168.1.1,192.168.1.2"])
+        writer = TextfileWriter(args)
+        writer.write()
+        writer.close()
+
+        self.assertEqual(["zyxel_192.168.1.1.prom", "zyxel_192.168.1.2.prom"],
+                         sorted(os.listdir(self.tmpdir.name)))
+        output = open(os.path.join(self.tmpdir.name,
+                                   "zyxel_192.168.1.2.prom")).read()
+        self.assertIn("""zyxel_up{router="192.168.1.2"} 1""", output)
+        self.assertIn("""zyxel_line_rate{router="192.168.1.2",bearer="0","""
+                      + """stream="up"} 7833000""", output)
+
+    def test_writer_router_down(self):
+        args = get_arguments(["--user", "testuser",
+                              "--passwd", "testpassword",
+                              "--textfile-dir", self.tmpdir.name,
+                              "--targets", "192.168.1.3"])
+        writer = TextfileWriter(args)
+        writer.write()
+        writer.close()
+
+        output = open(os.path.join(self.tmpdir.name,
+                                   "zyxel_192.168.1.3.prom")).read()
+        self.assertIn("""zyxel_up{router="192.168.1.3"} 0""", output)
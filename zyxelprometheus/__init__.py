@@ -15,10 +15,27 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .arguments import get_arguments
-from .exceptions import InvalidArguments, InvalidPassword
-from .login import login, logout
-from .prometheus import prometheus
-from .scrape import scrape_xdsl, scrape_ifconfig
-from .server import serve
+from .exceptions import InvalidArguments, InvalidPassword, \
+    RouterUnavailable, StaleMetrics
+from .login import login, login_options, logout
+from .model import BearerRate, InterfaceCounters, RouterStats, XdslStatus
+from .offline import convert_captures, parse_captures, read_captures
+from .parse import parse_ifconfig, parse_net_dev, parse_stats, parse_xdsl
+from .prometheus import prometheus, render
+from .scrape import scrape_xdsl, scrape_ifconfig, scrape_interfaces, \
+    scrape_net_dev, Shell
 
 __version__ = "0.5.5"
+
+
+def __getattr__(name):
+    # The server and textfile modes need http.server, gzip and a thread
+    # pool, none of which are used when scraping once from the command
+    # line, so they're only imported when they're asked for.
+    if name == "serve":
+        from .server import serve
+        return serve
+    if name == "write_textfiles":
+        from .textfile import write_textfiles
+        return write_textfiles
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
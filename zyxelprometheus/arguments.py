@@ -16,6 +16,7 @@
 
 import argparse
 import os
+import re
 
 from .exceptions import InvalidArguments
 
@@ -38,13 +39,104 @@ parser.add_argument('--bind', type=str, nargs='?', default="0.0.0.0:9100",
 parser.add_argument('-d', '--serve', action="store_true", default=False,
                     help='run in server mode, collecting the statistics '
                     + 'each time /metrics is requested')
+parser.add_argument('--textfile-dir', type=str,
+                    help='write the metrics to a file in this directory for '
+                    + 'node_exporter\'s textfile collector instead of '
+                    + 'serving them, repeating every --scrape-interval '
+                    + 'seconds if it is given')
+parser.add_argument('--targets', type=str,
+                    help='a comma separated list of the routers that can be '
+                    + 'scraped with /probe?target=... when serving, or to '
+                    + 'write files for with --textfile-dir (defaults to '
+                    + '--host)')
+parser.add_argument('--capture-file', type=str,
+                    help='parse captured xdslctl and ifconfig output from '
+                    + 'this file (- for stdin) instead of connecting to the '
+                    + 'router, which may hold many captures one after '
+                    + 'another')
+parser.add_argument('--xdsl-file', type=str,
+                    help='parse captured xdslctl output from this file (- '
+                    + 'for stdin) instead of connecting to the router')
+parser.add_argument('--ifconfig-file', type=str,
+                    help='parse captured ifconfig or /proc/net/dev output '
+                    + 'from this file (- for stdin) instead of connecting to '
+                    + 'the router')
+parser.add_argument('--output-format', type=str, default="prometheus",
+                    choices=["prometheus", "openmetrics", "json"],
+                    help='the format to write parsed captures in: the '
+                    + 'Prometheus text format, OpenMetrics (for promtool '
+                    + 'tsdb create-blocks-from openmetrics) or one JSON '
+                    + 'object per line')
+parser.add_argument('--scrape-interval', type=float,
+                    help='when serving, scrape the router in the background '
+                    + 'every this many seconds and return the latest results '
+                    + 'from /metrics')
+parser.add_argument('--max-staleness', type=float,
+                    help='when using --scrape-interval, return an error from '
+                    + '/metrics if the latest results are older than this '
+                    + 'many seconds (defaults to three times the interval)')
+parser.add_argument('--sample-interval', type=float,
+                    help='when serving, also poll the interface byte '
+                    + 'counters every this many seconds and report the '
+                    + 'minimum, maximum and average throughput between '
+                    + 'scrapes')
+parser.add_argument('--sample-window', type=float, default=15,
+                    help='the number of seconds of samples to report the '
+                    + 'minimum, maximum and average throughput over, which '
+                    + 'should match the Prometheus scrape interval')
+parser.add_argument('--spool-dir', type=str,
+                    help='when using --scrape-interval, also save every '
+                    + 'scrape to a file in this directory so that they can '
+                    + 'be backfilled from /backfill after an outage')
+parser.add_argument('--spool-size', type=float, default=64,
+                    help='the maximum size of the spool file in megabytes, '
+                    + 'after which the oldest scrapes are overwritten')
+parser.add_argument('--max-sessions', type=int,
+                    help='the maximum number of routers to keep logged in '
+                    + 'to when serving /probe?target=... requests (defaults '
+                    + 'to the number of --targets, so none are logged out)')
 parser.add_argument('--raw', action="store_true", default=False,
                     help='prints out the raw values collected from the '
                     + 'router and exits')
 parser.add_argument('--ifconfig-only', action="store_true", default=False,
-                    help='only requests ifconfig data')
+                    help='only requests the interface statistics')
 parser.add_argument('--xdsl-only', action="store_true", default=False,
                     help='only requests XDSL data')
+parser.add_argument('--xdsl-stats', action="store_true", default=False,
+                    help='runs xdslctl info --stats to also collect the SNR '
+                    + 'margin, attenuation, power and error counters')
+parser.add_argument('--use-ifconfig', action="store_true", default=False,
+                    help='always run ifconfig to get the interface '
+                    + 'statistics, rather than trying to read '
+                    + '/proc/net/dev first')
+parser.add_argument('--iface-include', type=str,
+                    help='only collect statistics for interfaces whose name '
+                    + 'matches this regular expression, e.g. "ppp.*|br0"')
+parser.add_argument('--iface-exclude', type=str,
+                    help='don\'t collect statistics for interfaces whose '
+                    + 'name matches this regular expression')
+parser.add_argument('--timeout', type=float, default=5,
+                    help='the number of seconds to wait for the router to '
+                    + 'respond to a command')
+parser.add_argument('--scrape-timeout', type=float,
+                    help='when serving, give up on a scrape that takes '
+                    + 'longer than this many seconds in total, including '
+                    + 'logging in (defaults to twice --timeout)')
+parser.add_argument('--ssh-keepalive', type=float, default=0,
+                    help='send an SSH keepalive every this many seconds so '
+                    + 'that dropped connections are noticed (0 disables)')
+parser.add_argument('--ssh-compression', action="store_true", default=False,
+                    help='compress the SSH connection, which can help with '
+                    + 'large ifconfig outputs over slow links')
+parser.add_argument('--ssh-ciphers', type=str,
+                    help='a comma separated list of the SSH ciphers to '
+                    + 'allow, e.g. aes128-ctr for routers with slow CPUs')
+parser.add_argument('--ssh-kex', type=str,
+                    help='a comma separated list of the SSH key exchange '
+                    + 'algorithms to allow')
+parser.add_argument('--known-hosts', type=str,
+                    help='a file to store the router\'s host keys in, '
+                    + 'which will be created if it doesn\'t exist')
 
 
 def get_arguments(args):
@@ -54,7 +146,25 @@ def get_arguments(args):
     if "ZYXEL_PASSWD" in os.environ:
         args.passwd = os.environ["ZYXEL_PASSWD"]
 
-    if args.passwd is None:
+    files = [filename for filename in (args.capture_file, args.xdsl_file,
+                                       args.ifconfig_file)
+             if filename is not None]
+    args.offline = len(files) > 0
+
+    if args.offline and (args.serve or args.raw
+                         or args.textfile_dir is not None):
+        raise InvalidArguments("Can't parse captures with serving, raw or "
+                               + "textfile mode.")
+
+    if args.capture_file is not None and len(files) > 1:
+        raise InvalidArguments("--capture-file can't be used with "
+                               + "--xdsl-file or --ifconfig-file.")
+
+    if files.count("-") > 1:
+        raise InvalidArguments("Only one capture file can be read from "
+                               + "stdin.")
+
+    if args.passwd is None and not args.offline:
         raise InvalidArguments("No password supplied. Either use --passwd "
                                + "or set $ZYXEL_PASSWD")
 
@@ -62,6 +172,72 @@ def get_arguments(args):
         raise InvalidArguments("Can't use raw mode when serving mode is "
                                + "turned on.")
 
+    if args.textfile_dir is not None and (args.serve or args.raw):
+        raise InvalidArguments("Can't use --textfile-dir with serving or "
+                               + "raw mode.")
+
+    if args.targets is not None and not args.serve \
+            and args.textfile_dir is None:
+        raise InvalidArguments("--targets can only be used with serving "
+                               + "mode or --textfile-dir.")
+
+    args.targets = [target.strip() for target in args.targets.split(",")
+                    if target.strip()] if args.targets is not None \
+        else [args.host]
+    if len(args.targets) == 0:
+        raise InvalidArguments("--targets must list at least one router.")
+
+    if args.scrape_interval is not None and args.scrape_interval <= 0:
+        raise InvalidArguments("--scrape-interval must be greater than 0.")
+
+    if args.max_staleness is not None and args.scrape_interval is None:
+        raise InvalidArguments("--max-staleness can only be used with "
+                               + "--scrape-interval.")
+
+    if args.scrape_interval is not None and args.max_staleness is None:
+        args.max_staleness = args.scrape_interval * 3
+
+    if args.sample_interval is not None and args.sample_interval <= 0:
+        raise InvalidArguments("--sample-interval must be greater than 0.")
+
+    if args.sample_window <= 0:
+        raise InvalidArguments("--sample-window must be greater than 0.")
+
+    if args.spool_dir is not None and args.scrape_interval is None:
+        raise InvalidArguments("--spool-dir can only be used with "
+                               + "--scrape-interval.")
+
+    if args.spool_size <= 0:
+        raise InvalidArguments("--spool-size must be greater than 0.")
+
+    if args.max_sessions is None:
+        args.max_sessions = len(args.targets)
+    elif args.max_sessions < 1:
+        raise InvalidArguments("--max-sessions must be at least 1.")
+
+    for option in ("iface_include", "iface_exclude"):
+        if getattr(args, option) is not None:
+            try:
+                setattr(args, option, re.compile(getattr(args, option)))
+            except re.error as e:
+                name = option.replace("_", "-")
+                raise InvalidArguments(f"Invalid --{name} expression: {e}")
+
+    if args.scrape_timeout is None:
+        args.scrape_timeout = args.timeout * 2
+    elif args.scrape_timeout <= 0:
+        raise InvalidArguments("--scrape-timeout must be greater than 0.")
+
+    if args.ssh_keepalive < 0:
+        raise InvalidArguments("--ssh-keepalive can't be negative.")
+
+    if args.ssh_ciphers is not None:
+        args.ssh_ciphers = [c.strip() for c in args.ssh_ciphers.split(",")
+                            if c.strip()]
+    if args.ssh_kex is not None:
+        args.ssh_kex = [k.strip() for k in args.ssh_kex.split(",")
+                        if k.strip()]
+
     if ":" not in args.bind:
         args.bind = (args.bind, 9100)
     else:
@@ -0,0 +1,78 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+WRAP_32 = 2 ** 32
+
+INTERFACE_COUNTERS = [
+    "rx_bytes", "rx_packets", "rx_errors", "rx_dropped", "rx_overruns",
+    "rx_frame", "tx_bytes", "tx_packets", "tx_errors", "tx_dropped",
+    "tx_overruns", "tx_carrier", "collisions"]
+
+
+class CounterTracker:
+    def __init__(self):
+        self.previous = {}
+        self.relogged = set()
+        self.wraps = 0
+        self.resets = 0
+
+    def reconnected(self):
+        # The router may have rebooted while we weren't logged in, so the
+        # next decrease of each counter is a reset, even if it would look
+        # like a wrap.
+        self.relogged = set(self.previous)
+
+    def update(self, key, raw):
+        if key not in self.previous:
+            self.previous[key] = (raw, raw)
+            return raw
+
+        last_raw, total = self.previous[key]
+        relogged = key in self.relogged
+        self.relogged.discard(key)
+        if raw >= last_raw:
+            total += raw - last_raw
+        elif not relogged and last_raw < WRAP_32 \
+                and WRAP_32 - last_raw + raw < WRAP_32 // 2:
+            # A 32 bit counter that has gone past 2^32, so it has dropped
+            # from near the top to near zero. A reset normally leaves it a
+            # smaller distance below where it was.
+            self.wraps += 1
+            total += WRAP_32 - last_raw + raw
+        else:
+            # The router rebooted or the interface was recreated, so
+            # count up again from zero.
+            self.resets += 1
+            total += raw
+
+        self.previous[key] = (raw, total)
+        return total
+
+    def update_interfaces(self, interfaces):
+        seen = set()
+        for iface in interfaces:
+            for name in INTERFACE_COUNTERS:
+                raw = getattr(iface, name)
+                if raw is None:
+                    continue
+                key = (iface.name, name)
+                seen.add(key)
+                setattr(iface, name, self.update(key, raw))
+
+        # Forget interfaces that have gone away, such as PPP sessions that
+        # are recreated with new names.
+        for key in set(self.previous) - seen:
+            del self.previous[key]
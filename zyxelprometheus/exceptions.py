@@ -20,3 +20,11 @@ class InvalidArguments(Exception):
 
 class InvalidPassword(Exception):
     pass
+
+
+class RouterUnavailable(Exception):
+    pass
+
+
+class StaleMetrics(Exception):
+    pass
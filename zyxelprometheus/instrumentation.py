@@ -0,0 +1,147 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from contextlib import contextmanager
+import threading
+import time
+
+SSH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CPU_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+               0.5, 1)
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if len(pairs) == 0:
+        return ""
+    return "{" + ",".join(f"""{name}="{value}\"""" for name, value in pairs) \
+        + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = \
+                self.values.get(label_values, 0) + amount
+
+    def family(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        if len(values) == 0 and len(self.labels) == 0:
+            values = [((), 0)]
+
+        return (self.name, "counter", self.help,
+                [(_labels(self.labels, label_values), value)
+                 for label_values, value in values])
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            if label_values not in self.values:
+                # One count per bucket, then +Inf, then the sum.
+                self.values[label_values] = [0] * (len(self.buckets) + 1) \
+                    + [0.0]
+            values = self.values[label_values]
+            for index, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    values[index] += 1
+                    break
+            else:
+                values[len(self.buckets)] += 1
+            values[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, *label_values)
+
+    def family(self):
+        with self.lock:
+            values = sorted((label_values, list(counts))
+                            for label_values, counts in self.values.items())
+
+        # Samples carry their _bucket, _sum or _count suffix in front of
+        # their labels.
+        samples = []
+        for label_values, counts in values:
+            count = 0
+            for bucket, bucket_count in zip(self.buckets + (None, ),
+                                            counts):
+                count += bucket_count
+                le = "+Inf" if bucket is None else float(bucket)
+                labels = _labels(self.labels, label_values, [("le", le)])
+                samples.append((f"_bucket{labels}", count))
+            labels = _labels(self.labels, label_values)
+            samples.append((f"_sum{labels}", counts[-1]))
+            samples.append((f"_count{labels}", count))
+
+        return (self.name, "histogram", self.help, samples)
+
+
+LOGIN_SECONDS = Histogram(
+    "zyxel_exporter_login_seconds",
+    "Time taken to connect and log in to the router.", SSH_BUCKETS)
+CHANNEL_OPEN_SECONDS = Histogram(
+    "zyxel_exporter_channel_open_seconds",
+    "Time taken to open a shell on the router and wait for its prompt.",
+    SSH_BUCKETS)
+COMMAND_SECONDS = Histogram(
+    "zyxel_exporter_command_seconds",
+    "Time spent waiting for the output of a command.", SSH_BUCKETS,
+    ("command", ))
+PARSE_SECONDS = Histogram(
+    "zyxel_exporter_parse_seconds",
+    "Time taken to parse the output of the commands.", CPU_BUCKETS)
+RENDER_SECONDS = Histogram(
+    "zyxel_exporter_render_seconds",
+    "Time taken to render the metrics.", CPU_BUCKETS)
+TIMEOUTS = Counter(
+    "zyxel_exporter_timeouts_total",
+    "Reads that timed out waiting for the router.")
+RECONNECTS = Counter(
+    "zyxel_exporter_reconnects_total",
+    "Logins to a router that the exporter had been logged in to before.")
+AUTH_FAILURES = Counter(
+    "zyxel_exporter_auth_failures_total",
+    "Logins that were rejected by the router.")
+
+METRICS = [LOGIN_SECONDS, CHANNEL_OPEN_SECONDS, COMMAND_SECONDS,
+           PARSE_SECONDS, RENDER_SECONDS, TIMEOUTS, RECONNECTS,
+           AUTH_FAILURES]
+
+
+def exporter_families():
+    return [metric.family() for metric in METRICS]
@@ -15,25 +15,75 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import json
+import os
 
-import paramiko
-from paramiko.client import SSHClient
-from paramiko.ssh_exception import AuthenticationException
+from .exceptions import InvalidArguments, InvalidPassword
+from .instrumentation import AUTH_FAILURES, LOGIN_SECONDS
 
-from .exceptions import InvalidPassword
 
+def disabled_algorithms(kind, preferred, supported):
+    unknown = [name for name in preferred if name not in supported]
+    if unknown:
+        raise InvalidArguments(f"Unsupported SSH {kind}: "
+                               + ", ".join(unknown))
+    # paramiko only lets us turn algorithms off, so disable everything
+    # that wasn't asked for.
+    return [name for name in supported if name not in preferred]
+
+
+def login(host, username, password, port=22, timeout=None, keepalive=0,
+          compress=False, ciphers=None, kex=None, known_hosts=None):
+    # paramiko takes a long time to import, so only load it when we need to
+    # connect.
+    import paramiko
+    from paramiko.client import SSHClient
+    from paramiko.ssh_exception import AuthenticationException
 
-def login(host, username, password):
     session = SSHClient()
+    if known_hosts is not None:
+        if not os.path.exists(known_hosts):
+            open(known_hosts, "a").close()
+        # AutoAddPolicy saves new keys back to this file, so later
+        # connections can verify the router instead of trusting blindly.
+        session.load_host_keys(known_hosts)
     session.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
+    disabled = {}
+    if ciphers:
+        disabled["ciphers"] = disabled_algorithms(
+            "ciphers", ciphers, paramiko.Transport._preferred_ciphers)
+    if kex:
+        disabled["kex"] = disabled_algorithms(
+            "key exchange algorithms", kex, paramiko.Transport._preferred_kex)
+
     try:
-        session.connect(hostname=host, username=username, password=password)
+        with LOGIN_SECONDS.time():
+            # Only password authentication is used, so don't spend round
+            # trips offering the local keys and agent to the router first.
+            session.connect(hostname=host, port=port, username=username,
+                            password=password, timeout=timeout,
+                            banner_timeout=timeout, auth_timeout=timeout,
+                            allow_agent=False, look_for_keys=False,
+                            compress=compress,
+                            disabled_algorithms=disabled or None)
     except AuthenticationException:
+        AUTH_FAILURES.inc()
         raise InvalidPassword()
 
+    if keepalive:
+        session.get_transport().set_keepalive(keepalive)
+
     return session
 
 
+def login_options(args):
+    return {"timeout": args.timeout,
+            "keepalive": args.ssh_keepalive,
+            "compress": args.ssh_compression,
+            "ciphers": args.ssh_ciphers,
+            "kex": args.ssh_kex,
+            "known_hosts": args.known_hosts}
+
+
 def logout(session):
     session.close()
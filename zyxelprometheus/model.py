@@ -0,0 +1,81 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass
+class BearerRate:
+    bearer: int
+    upstream: int
+    downstream: int
+
+
+@dataclass
+class StreamValues:
+    down: Optional[float]
+    up: Optional[float]
+
+
+@dataclass
+class XdslStatus:
+    status: Optional[str] = None
+    max_upstream: Optional[int] = None
+    max_downstream: Optional[int] = None
+    bearers: List[BearerRate] = field(default_factory=list)
+    last_retrain_reason: Optional[int] = None
+    link_uptime: Optional[int] = None
+    snr_margin: Optional[StreamValues] = None
+    attenuation: Optional[StreamValues] = None
+    power: Optional[StreamValues] = None
+    fec: Optional[StreamValues] = None
+    crc: Optional[StreamValues] = None
+    es: Optional[StreamValues] = None
+    ses: Optional[StreamValues] = None
+    uas: Optional[StreamValues] = None
+    los: Optional[StreamValues] = None
+    lof: Optional[StreamValues] = None
+    hec: Dict[int, StreamValues] = field(default_factory=dict)
+
+
+@dataclass
+class InterfaceCounters:
+    name: str
+    flags: List[str] = field(default_factory=list)
+    mtu: Optional[int] = None
+    rx_bytes: Optional[int] = None
+    rx_packets: Optional[int] = None
+    rx_errors: Optional[int] = None
+    rx_dropped: Optional[int] = None
+    rx_overruns: Optional[int] = None
+    rx_frame: Optional[int] = None
+    tx_bytes: Optional[int] = None
+    tx_packets: Optional[int] = None
+    tx_errors: Optional[int] = None
+    tx_dropped: Optional[int] = None
+    tx_overruns: Optional[int] = None
+    tx_carrier: Optional[int] = None
+    collisions: Optional[int] = None
+    txqueuelen: Optional[int] = None
+
+
+@dataclass
+class RouterStats:
+    xdsl: Optional[XdslStatus] = None
+    interfaces: Optional[List[InterfaceCounters]] = None
+    up: bool = True
@@ -0,0 +1,228 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from dataclasses import asdict
+from itertools import zip_longest
+import json
+import re
+import shutil
+import sys
+import tempfile
+
+from .exceptions import InvalidArguments
+from .parse import NET_DEV_HEADER, parse_stats
+from .prometheus import metric_families
+from .spool import backfill_chunks
+
+# Archives of captures are usually made by appending the command outputs to
+# a file from cron, optionally with the output of `date +@%s` before each
+# capture to record when it was taken:
+#
+# @1600000000
+# xdslctl: ADSL driver and PHY status
+# ...
+# Inter-|   Receive                            ...
+# ...
+capture_marker_re = re.compile(r"@(\d+(?:\.\d+)?)$")
+
+XDSL_HEADER = "xdslctl:"
+IFCONFIG_HEADER = "Link encap:"
+
+
+class CaptureReader:
+    def __init__(self, default=None):
+        # Lines before the first header are added to the default section,
+        # for files that only have one kind of output in them.
+        self.default = default
+        self.timestamp = None
+        self.sections = {}
+        self.section = None
+        self.headers = set()
+        self.ifaces = set()
+
+    def flush(self):
+        capture = None
+        if len(self.sections) > 0:
+            capture = (self.timestamp,
+                       "\n".join(self.sections["xdsl"])
+                       if "xdsl" in self.sections else None,
+                       "\n".join(self.sections["ifconfig"])
+                       if "ifconfig" in self.sections else None)
+        self.timestamp = None
+        self.sections = {}
+        self.section = None
+        self.headers = set()
+        self.ifaces = set()
+        return capture
+
+    def start(self, section, header=True):
+        # A second header of the same kind means a new capture has started.
+        capture = self.flush() if section in self.headers else None
+        self.sections.setdefault(section, [])
+        if header:
+            self.headers.add(section)
+        self.section = section
+        return capture
+
+    def add(self, line):
+        capture = None
+        match = capture_marker_re.match(line)
+        if match is not None:
+            capture = self.flush()
+            self.timestamp = float(match.group(1))
+            return capture
+
+        if line.startswith(XDSL_HEADER):
+            capture = self.start("xdsl")
+        elif line.lstrip().startswith(NET_DEV_HEADER):
+            capture = self.start("ifconfig")
+        elif IFCONFIG_HEADER in line and not line[0].isspace():
+            # ifconfig has no header, so a new capture starts when an
+            # interface is seen twice.
+            name = line.split(None, 1)[0]
+            if name in self.ifaces:
+                capture = self.flush()
+            if self.section != "ifconfig" or "ifconfig" not in self.headers:
+                capture = self.start("ifconfig") or capture
+            self.ifaces.add(name)
+        elif self.section == "ifconfig" and line[:1].strip() \
+                and ":" not in line:
+            # The start of the next command's output, like the command
+            # itself, which would otherwise be read as an interface.
+            self.section = None
+            return None
+        elif self.section is None:
+            if self.default is None:
+                # Anything before the first output, like the command that
+                # was run, is skipped.
+                return None
+            capture = self.start(self.default, header=False)
+
+        self.sections[self.section].append(line)
+        return capture
+
+
+def read_captures(lines, default=None):
+    # Only one capture is held in memory at a time, so archives of any size
+    # can be read.
+    reader = CaptureReader(default)
+    for line in lines:
+        capture = reader.add(line.rstrip("\r\n"))
+        if capture is not None:
+            yield capture
+    capture = reader.flush()
+    if capture is not None:
+        yield capture
+
+
+def merge_captures(xdsl_captures, ifconfig_captures):
+    # Pairs up the captures from separate xdslctl and ifconfig files.
+    for xdsl, ifconfig in zip_longest(xdsl_captures, ifconfig_captures,
+                                      fillvalue=(None, None, None)):
+        timestamp = xdsl[0] if xdsl[0] is not None else ifconfig[0]
+        yield (timestamp, xdsl[1], ifconfig[2])
+
+
+def parse_captures(captures, include=None, exclude=None):
+    for (timestamp, xdsl, ifconfig) in captures:
+        yield (timestamp, parse_stats(xdsl, ifconfig, include, exclude))
+
+
+def format_json(timestamp, stats):
+    return json.dumps({"timestamp": timestamp,
+                       "xdsl": asdict(stats.xdsl)
+                       if stats.xdsl is not None else None,
+                       "interfaces": [asdict(iface)
+                                      for iface in stats.interfaces]
+                       if stats.interfaces is not None else None}) + "\n"
+
+
+def open_capture_file(filename):
+    if filename == "-":
+        if sys.stdin.seekable():
+            return sys.stdin
+        # The captures are read more than once, so a pipe is copied to a
+        # temporary file rather than into memory.
+        f = tempfile.TemporaryFile("w+", errors="replace")
+        shutil.copyfileobj(sys.stdin, f)
+        return f
+    return open(filename, "r", errors="replace")
+
+
+class CaptureFiles:
+    def __init__(self, args):
+        self.files = {}
+        for kind, filename in (("captures", args.capture_file),
+                               ("xdsl", args.xdsl_file),
+                               ("ifconfig", args.ifconfig_file)):
+            if filename is not None:
+                self.files[kind] = open_capture_file(filename)
+
+    def captures(self):
+        # Each call reads the files from the beginning again.
+        for f in self.files.values():
+            f.seek(0)
+        if "captures" in self.files:
+            return read_captures(self.files["captures"])
+        return merge_captures(
+            read_captures(self.files["xdsl"], "xdsl")
+            if "xdsl" in self.files else (),
+            read_captures(self.files["ifconfig"], "ifconfig")
+            if "ifconfig" in self.files else ())
+
+    def close(self):
+        for f in self.files.values():
+            if f is not sys.stdin:
+                f.close()
+
+
+def convert_captures(args, output):
+    files = CaptureFiles(args)
+    try:
+        if args.output_format == "json":
+            for (timestamp, stats) in parse_captures(files.captures(),
+                                                     args.iface_include,
+                                                     args.iface_exclude):
+                output.write(format_json(timestamp, stats))
+            return
+
+        count = 0
+        untimed = 0
+        for (timestamp, _, _) in files.captures():
+            count += 1
+            if timestamp is None:
+                untimed += 1
+        if count > 1 and untimed > 0:
+            raise InvalidArguments(
+                f"{untimed} of the {count} captures don't have an "
+                + "@<timestamp> line, so their samples can't be told apart. "
+                + "Use --output-format json for them instead.")
+
+        # Each metric family can only appear once, so the samples from all
+        # of the captures are grouped together, reading the files again
+        # rather than holding every capture in memory.
+        def read_records():
+            for (timestamp, stats) in parse_captures(files.captures(),
+                                                     args.iface_include,
+                                                     args.iface_exclude):
+                yield (timestamp, metric_families(stats))
+
+        for chunk in backfill_chunks(
+                read_records, count,
+                openmetrics=args.output_format == "openmetrics"):
+            output.write(chunk)
+    finally:
+        files.close()
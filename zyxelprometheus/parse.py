@@ -0,0 +1,257 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import re
+
+from .model import BearerRate, InterfaceCounters, RouterStats, \
+    StreamValues, XdslStatus
+
+# xdslctl: ADSL driver and PHY status
+# Status: Showtime
+# Last Retrain Reason:	0
+# Last initialization procedure status:	0
+# Max:	Upstream rate = 7833 Kbps, Downstream rate = 47522 Kbps
+# Bearer:	0, Upstream rate = 7833 Kbps, Downstream rate = 39999 Kbps
+# Bearer:	1, Upstream rate = 0 Kbps, Downstream rate = 0 Kbps
+
+max_line_rate_re = re.compile(
+    r"Max:\s+Upstream rate = (?P<upstream>\d+) Kbps,\s+"
+    + r"Downstream rate = (?P<downstream>\d+) Kbps")
+
+line_rate_re = re.compile(
+    r"Bearer:\s+(?P<bearer>\d), Upstream rate = (?P<upstream>\d+) Kbps,\s+"
+    + r"Downstream rate = (?P<downstream>\d+) Kbps")
+
+# With --stats xdslctl also prints line quality values and error counters,
+# as "Label: <down> <up>". The counters are repeated for several periods,
+# of which the Total time period is used.
+#
+# SNR (dB):	 9.1		 6.4
+# Attn(dB):	 13.8		 0.0
+# Pwr(dBm):	 13.5		 5.6
+# ...
+# 			Bearer 0
+# HEC:		7		2
+# ...
+# Total time = 1 days 22 hours 47 min 56 sec
+# FEC:		1234		56
+# CRC:		3		12
+# ...
+# Since Link time = 1 days 22 hours 46 min 16 sec
+
+xdsl_gauge_lines = {
+    "SNR (dB)": "snr_margin",
+    "Attn(dB)": "attenuation",
+    "Pwr(dBm)": "power",
+}
+
+xdsl_counter_lines = {
+    "FEC": "fec",
+    "CRC": "crc",
+    "ES": "es",
+    "SES": "ses",
+    "UAS": "uas",
+    "LOS": "los",
+    "LOF": "lof",
+}
+
+duration_re = re.compile(r"(\d+) (days|hours|min|sec)")
+
+DURATION_UNITS = {"days": 86400, "hours": 3600, "min": 60, "sec": 1}
+
+# br0       Link encap:Ethernet  HWaddr E4:18:6B:06:87:70
+#           inet addr:192.168.1.1  Bcast:192.168.1.255  Mask:255.255.255.0
+#           inet6 addr: fe80::e618:6bff:fe06:8770/64 Scope:Link
+#           UP BROADCAST RUNNING ALLMULTI MULTICAST  MTU:1500  Metric:1
+#           RX packets:7968422 errors:0 dropped:19510 overruns:0 frame:0
+#           TX packets:11495200 errors:0 dropped:0 overruns:0 carrier:0
+#           collisions:0 txqueuelen:0
+#           RX bytes:2713281739 (2.5 GiB)  TX bytes:1342943018 (1.2 GiB)
+
+counter_re = re.compile(r"(?:(RX|TX) )?(\w+):(\d+)")
+
+# Inter-|   Receive                            ...
+#  face |bytes    packets errs drop fifo frame ...
+#    br0:2713281739 7968422    0 19510    0     0 ...
+NET_DEV_HEADER = "Inter-|"
+NET_DEV_FIELDS = [
+    "rx_bytes", "rx_packets", "rx_errors", "rx_dropped", "rx_overruns",
+    "rx_frame", None, None, "tx_bytes", "tx_packets", "tx_errors",
+    "tx_dropped", "tx_overruns", "collisions", "tx_carrier", None]
+
+COUNTER_FIELDS = frozenset([
+    "rx_bytes", "rx_packets", "rx_errors", "rx_dropped", "rx_overruns",
+    "rx_frame", "tx_bytes", "tx_packets", "tx_errors", "tx_dropped",
+    "tx_overruns", "tx_carrier", "collisions", "txqueuelen"])
+
+
+def _convert(value, convert):
+    try:
+        return convert(value)
+    except ValueError:
+        # Some firmware prints text like N/A instead of a number.
+        return None
+
+
+def _stream_values(values, convert):
+    values = values.split()
+    if len(values) != 2:
+        return None
+    down = _convert(values[0], convert)
+    up = _convert(values[1], convert)
+    if down is None and up is None:
+        return None
+    return StreamValues(down, up)
+
+
+def _duration(duration):
+    return sum(int(value) * DURATION_UNITS[unit]
+               for value, unit in duration_re.findall(duration))
+
+
+def parse_xdsl(xdsl):
+    status = XdslStatus()
+    period = None
+    bearer = None
+    for line in xdsl.splitlines():
+        label, colon, values = line.partition(":")
+        if colon == "":
+            header = line.strip()
+            if " time = " in header:
+                period, _, duration = header.partition(" time = ")
+                if period == "Since Link":
+                    status.link_uptime = _duration(duration)
+            elif header.startswith("Bearer ") and header[7:].isdigit():
+                bearer = int(header[7:])
+            continue
+
+        if label == "Status":
+            status.status = values.strip()
+        elif label == "Max":
+            match = max_line_rate_re.match(line)
+            if match is not None:
+                status.max_upstream = int(match.group("upstream"))*1000
+                status.max_downstream = int(match.group("downstream"))*1000
+        elif label == "Bearer":
+            match = line_rate_re.match(line)
+            if match is not None:
+                status.bearers.append(
+                    BearerRate(int(match.group("bearer")),
+                               int(match.group("upstream"))*1000,
+                               int(match.group("downstream"))*1000))
+        elif label == "Last Retrain Reason" and values.strip().isdigit():
+            status.last_retrain_reason = int(values.strip())
+        elif label in xdsl_gauge_lines:
+            setattr(status, xdsl_gauge_lines[label],
+                    _stream_values(values, float))
+        elif label in xdsl_counter_lines:
+            # Counters before the first period are the totals on some
+            # firmware versions, but the Total time period wins if present.
+            if period is None or period == "Total":
+                setattr(status, xdsl_counter_lines[label],
+                        _stream_values(values, int))
+        elif label == "HEC" and bearer is not None:
+            values = _stream_values(values, int)
+            if values is not None:
+                status.hec[bearer] = values
+
+    return status
+
+
+def iface_selected(name, include=None, exclude=None):
+    if include is not None and include.fullmatch(name) is None:
+        return False
+    return exclude is None or exclude.fullmatch(name) is None
+
+
+def parse_ifconfig(ifconfig, include=None, exclude=None):
+    ifaces = []
+    iface = None
+    for line in ifconfig.splitlines():
+        if line == "" or line.isspace():
+            continue
+
+        if not line[0].isspace():
+            name = line.split(None, 1)[0]
+            if iface_selected(name, include, exclude):
+                iface = InterfaceCounters(name)
+                ifaces.append(iface)
+            else:
+                # Skip the rest of this interface's lines without parsing
+                # them.
+                iface = None
+            continue
+        if iface is None:
+            continue
+
+        line = line.lstrip()
+        if line.startswith(("RX ", "TX ", "collisions:")):
+            # RX and TX apply to the following values on the same line, e.g.
+            # rx_packets, rx_errors or rx_bytes and then tx_bytes.
+            prefix = ""
+            for stream, key, value in counter_re.findall(line):
+                if stream:
+                    prefix = stream.lower() + "_"
+                if prefix + key in COUNTER_FIELDS:
+                    setattr(iface, prefix + key, int(value))
+        elif "MTU:" in line:
+            flags, _, rest = line.partition("MTU:")
+            iface.flags = flags.split()
+            iface.mtu = int(rest.split(None, 1)[0])
+
+    return ifaces
+
+
+def is_net_dev(output):
+    return output.lstrip().startswith(NET_DEV_HEADER)
+
+
+def parse_net_dev(net_dev, include=None, exclude=None):
+    ifaces = []
+    for line in net_dev.splitlines():
+        # The two header lines don't have a colon in them.
+        name, sep, values = line.partition(":")
+        if not sep:
+            continue
+
+        name = name.strip()
+        if not iface_selected(name, include, exclude):
+            continue
+
+        values = values.split()
+        if len(values) != len(NET_DEV_FIELDS):
+            continue
+        iface = InterfaceCounters(name)
+        for field, value in zip(NET_DEV_FIELDS, values):
+            if field is not None:
+                setattr(iface, field, int(value))
+        ifaces.append(iface)
+
+    return ifaces
+
+
+def parse_interfaces(output, include=None, exclude=None):
+    if is_net_dev(output):
+        return parse_net_dev(output, include, exclude)
+    return parse_ifconfig(output, include, exclude)
+
+
+def parse_stats(xdsl, ifconfig, include=None, exclude=None):
+    return RouterStats(
+        parse_xdsl(xdsl) if xdsl is not None else None,
+        parse_interfaces(ifconfig, include, exclude)
+        if ifconfig is not None else None)
@@ -1,89 +1,218 @@
-import re
+from functools import lru_cache
 
+from .parse import parse_stats
 
-# xdslctl: ADSL driver and PHY status
-# Status: Showtime
-# Last Retrain Reason:	0
-# Last initialization procedure status:	0
-# Max:	Upstream rate = 7833 Kbps, Downstream rate = 47522 Kbps
-# Bearer:	0, Upstream rate = 7833 Kbps, Downstream rate = 39999 Kbps
-# Bearer:	1, Upstream rate = 0 Kbps, Downstream rate = 0 Kbps
+CACHE_SIZE = 100000
 
+TEXT_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = \
+    "application/openmetrics-text; version=1.0.0; charset=utf-8"
 
-max_line_rate_re = re.compile(
-    r"Max:\s+Upstream rate = (?P<upstream>\d+) Kbps,\s+"
-    + r"Downstream rate = (?P<downstream>\d+) Kbps")
+xdsl_gauges_map = [
+    ("zyxel_xdsl_snr_margin_db", "The signal to noise ratio margin.",
+     "snr_margin"),
+    ("zyxel_xdsl_attenuation_db", "The line attenuation.", "attenuation"),
+    ("zyxel_xdsl_power_dbm", "The output power.", "power"),
+]
 
-line_rate_re = re.compile(
-    r"Bearer:\s+(?P<bearer>\d), Upstream rate = (?P<upstream>\d+) Kbps,\s+"
-    + r"Downstream rate = (?P<downstream>\d+) Kbps")
+xdsl_counters_map = [
+    ("zyxel_xdsl_fec_errors", "Errors corrected by forward error correction.",
+     "fec"),
+    ("zyxel_xdsl_crc_errors", "CRC errors.", "crc"),
+    ("zyxel_xdsl_errored_seconds", "Seconds with at least one error.", "es"),
+    ("zyxel_xdsl_severely_errored_seconds", "Severely errored seconds.",
+     "ses"),
+    ("zyxel_xdsl_unavailable_seconds", "Seconds the line was unavailable.",
+     "uas"),
+    ("zyxel_xdsl_loss_of_signal", "Loss of signal failures.", "los"),
+    ("zyxel_xdsl_loss_of_frame", "Loss of frame failures.", "lof"),
+]
 
-# br0       Link encap:Ethernet  HWaddr E4:18:6B:06:87:70
-#           inet addr:192.168.1.1  Bcast:192.168.1.255  Mask:255.255.255.0
-#           inet6 addr: fe80::e618:6bff:fe06:8770/64 Scope:Link
-#           UP BROADCAST RUNNING ALLMULTI MULTICAST  MTU:1500  Metric:1
-#           RX packets:7968422 errors:0 dropped:19510 overruns:0 frame:0
-#           TX packets:11495200 errors:0 dropped:0 overruns:0 carrier:0
-#           collisions:0 txqueuelen:0
-#           RX bytes:2713281739 (2.5 GiB)  TX bytes:1342943018 (1.2 GiB)
+iface_stats_map = [
+    ("zyxel_bytes", "Bytes sent/received.", "bytes"),
+    ("zyxel_packets", "Bytes sent/received.", "packets"),
+    ("zyxel_errors", "Bytes sent/received.", "errors"),
+    ("zyxel_dropped", "Bytes sent/received.", "dropped"),
+]
 
-iface_re = re.compile(r"^([\w.]+)\s+(.*?)^$", re.MULTILINE | re.DOTALL)
 
-packets_re = re.compile(r"(RX|TX) packets:(\d+)")
-errors_re = re.compile(r"(RX|TX).*errors:(\d+)")
-dropped_re = re.compile(r"(RX|TX).*dropped:(\d+)")
+def _stream_samples(values, bearer=None):
+    # A value that couldn't be parsed is left out.
+    samples = []
+    if values.up is not None:
+        samples.append((stream_labels("up", bearer), values.up))
+    if values.down is not None:
+        samples.append((stream_labels("down", bearer), values.down))
+    return samples
 
-bytes_re = re.compile(r"(RX|TX) bytes:(\d+)")
 
-iface_stats_map = [
-    ("zyxel_bytes", "Bytes sent/received.", bytes_re),
-    ("zyxel_packets", "Bytes sent/received.", packets_re),
-    ("zyxel_errors", "Bytes sent/received.", errors_re),
-    ("zyxel_dropped", "Bytes sent/received.", dropped_re),
-]
+def metric_families(stats):
+    families = [("zyxel_up", "gauge",
+                 "Whether the router could be scraped.",
+                 [("", 1 if stats.up else 0)])]
+    if stats.xdsl is not None:
+        samples = []
+        for line_rate in stats.xdsl.bearers:
+            bearer = line_rate.bearer
+            if line_rate.upstream == 0 and line_rate.downstream == 0:
+                continue
+            samples.append((stream_labels("up", bearer),
+                            line_rate.upstream))
+            samples.append((stream_labels("down", bearer),
+                            line_rate.downstream))
+        families.append(("zyxel_line_rate", "gauge", "The line rate.",
+                         samples))
+
+        if stats.xdsl.max_upstream is not None:
+            families.append(("zyxel_max_line_rate", "gauge",
+                             "The maxiumum attainable line rate.",
+                             [("""{stream="up"}""",
+                               stats.xdsl.max_upstream),
+                              ("""{stream="down"}""",
+                               stats.xdsl.max_downstream)]))
+
+        xdsl_metrics = [(metric, help, "gauge", stat)
+                        for (metric, help, stat) in xdsl_gauges_map] \
+            + [(metric, help, "counter", stat)
+               for (metric, help, stat) in xdsl_counters_map]
+        for (metric, help, metric_type, stat) in xdsl_metrics:
+            values = getattr(stats.xdsl, stat)
+            if values is None:
+                continue
+            families.append((metric, metric_type, help,
+                             _stream_samples(values)))
+
+        samples = []
+        for bearer, values in stats.xdsl.hec.items():
+            if values is None:
+                continue
+            samples += _stream_samples(values, bearer)
+        families.append(("zyxel_xdsl_hec_errors", "counter",
+                         "Header error check errors.", samples))
+
+        if stats.xdsl.link_uptime is not None:
+            families.append(("zyxel_xdsl_link_uptime_seconds", "gauge",
+                             "How long the line has been connected. Drops "
+                             + "to zero when the line retrains.",
+                             [("", stats.xdsl.link_uptime)]))
+
+        if stats.xdsl.last_retrain_reason is not None:
+            families.append(("zyxel_xdsl_last_retrain_reason", "gauge",
+                             "The code of the reason the line last "
+                             + "retrained.",
+                             [("", stats.xdsl.last_retrain_reason)]))
+
+    if stats.interfaces is not None:
+        ifaces = [(iface, iface_labels("rx", iface.name),
+                   iface_labels("tx", iface.name))
+                  for iface in stats.interfaces]
+        for (metric, help, stat) in iface_stats_map:
+            rx_stat = f"rx_{stat}"
+            tx_stat = f"tx_{stat}"
+            samples = []
+            for (iface, rx_labels, tx_labels) in ifaces:
+                metric_value = getattr(iface, rx_stat)
+                if metric_value is not None:
+                    samples.append((rx_labels, metric_value))
+                metric_value = getattr(iface, tx_stat)
+                if metric_value is not None:
+                    samples.append((tx_labels, metric_value))
+            families.append((metric, "counter", help, samples))
+
+    return families
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
 
+@lru_cache(maxsize=CACHE_SIZE)
+def stream_labels(stream, bearer=None):
+    if bearer is None:
+        return f"""{{stream="{stream}"}}"""
+    return f"""{{bearer="{bearer}",stream="{stream}"}}"""
 
-def prometheus(xdsl, ifconfig):
-    output = []
-    if xdsl is not None:
-        for line_rate in line_rate_re.finditer(xdsl):
-            bearer = int(line_rate.group("bearer"))
-            line_rate_up = int(line_rate.group("upstream"))*1000
-            line_rate_down = int(line_rate.group("downstream"))*1000
-            if line_rate_up == 0 and line_rate_down == 0:
+
+@lru_cache(maxsize=CACHE_SIZE)
+def iface_labels(stream, iface):
+    return f"""{{stream="{stream}",iface="{escape_label(iface)}"}}"""
+
+
+class Renderer:
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.cache_size = cache_size
+        self.headers = {}
+        self.prefixes = {}
+
+    def header(self, metric, metric_type, help, openmetrics):
+        key = (metric, metric_type, help, openmetrics)
+        header = self.headers.get(key)
+        if header is None:
+            sample_name = metric
+            if openmetrics and metric_type == "counter":
+                # OpenMetrics counters are named without the _total suffix,
+                # which is added to each sample instead.
+                if metric.endswith("_total"):
+                    metric = metric[:-len("_total")]
+                sample_name = metric + "_total"
+
+            header = (f"# HELP {metric} {help}\n"
+                      + f"# TYPE {metric} {metric_type}\n", sample_name)
+            self.headers[key] = header
+        return header
+
+    def format_families(self, families, openmetrics=False):
+        # The label sets are the same from one scrape to the next, so only
+        # the values need to be formatted. The caches are emptied if they
+        # grow too big, e.g. because interfaces keep being renamed.
+        if sum(map(len, self.prefixes.values())) > self.cache_size:
+            self.headers = {}
+            self.prefixes = {}
+        output = []
+        for (metric, metric_type, help, samples) in families:
+            if len(samples) == 0:
                 continue
-            output.append("# HELP zyxel_line_rate The line rate.")
-            output.append("# TYPE zyxel_line_rate gauge")
-            output.append(f"""zyxel_line_rate{{bearer=\"{bearer}\","""
-                          + f"""stream="up"}} {line_rate_up}""")
-            output.append(
-                f"""zyxel_line_rate{{bearer=\"{bearer}\",stream="down"}}"""
-                + f""" {line_rate_down}""")
-
-        max_line_rate = max_line_rate_re.search(xdsl)
-        line_rate_up = int(max_line_rate.group("upstream"))*1000
-        line_rate_down = int(max_line_rate.group("downstream"))*1000
-        output.append(
-            "# HELP zyxel_max_line_rate The maxiumum attainable line rate.")
-        output.append(
-            "# TYPE zyxel_max_line_rate gauge")
-        output.append(
-            f"""zyxel_max_line_rate{{stream="up"}} {line_rate_up}""")
-        output.append(
-            f"""zyxel_max_line_rate{{stream="down"}} {line_rate_down}""")
-
-    if ifconfig is not None:
-        for (metric, help, metric_re) in iface_stats_map:
-            output.append(f"# HELP {metric} {help}")
-            output.append(f"# TYPE {metric} counter")
-            for iface in iface_re.finditer(ifconfig.replace("\r\n", "\n")):
-                iface_name = iface.group(1)
-                iface_stats = iface.group(2)
-                for groups in metric_re.finditer(iface_stats):
-                    metric_stream = groups.group(1).lower()
-                    metric_value = int(groups.group(2))
-                    output.append(
-                        f"""{metric}{{stream="{metric_stream}","""
-                        + f"""iface="{iface_name}"}} {metric_value}""")
-
-    return "\n".join(output)
+
+            header, sample_name = self.header(metric, metric_type, help,
+                                              openmetrics)
+            output.append(header)
+            prefixes = self.prefixes.get(sample_name)
+            if prefixes is None:
+                prefixes = self.prefixes[sample_name] = {}
+            for (labels, value) in samples:
+                prefix = prefixes.get(labels)
+                if prefix is None:
+                    prefix = prefixes[labels] = f"{sample_name}{labels} "
+                output.append(f"{prefix}{value}\n")
+
+        if openmetrics:
+            output.append("# EOF\n")
+
+        return "".join(output)
+
+
+RENDERER = Renderer()
+
+
+def format_families(families, openmetrics=False):
+    return RENDERER.format_families(families, openmetrics)
+
+
+def format_timestamp(timestamp, openmetrics=False):
+    # OpenMetrics timestamps are in seconds, the Prometheus text format's
+    # are in milliseconds.
+    if timestamp is None:
+        return ""
+    if openmetrics:
+        return f" {timestamp:.3f}"
+    return f" {int(timestamp * 1000)}"
+
+
+def render(stats, openmetrics=False):
+    return format_families(metric_families(stats), openmetrics)
+
+
+def prometheus(xdsl, ifconfig, openmetrics=False, include=None,
+               exclude=None):
+    return render(parse_stats(xdsl, ifconfig, include, exclude), openmetrics)
@@ -0,0 +1,137 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import deque
+import sys
+import threading
+import time
+
+from .counters import CounterTracker
+from .instrumentation import Histogram
+from .prometheus import escape_label, iface_labels
+
+# From 1 kB/s to 1 GB/s, four times bigger each time.
+RATE_BUCKETS = tuple(1000 * 4 ** power for power in range(11))
+
+
+class Sampler:
+    def __init__(self, sample, interval, window):
+        self.sample = sample
+        self.interval = interval
+        self.window = window
+
+        self.counters = CounterTracker()
+        self.previous = {}
+        self.rates = {}
+        self.histogram = Histogram(
+            "zyxel_throughput_bytes_per_second",
+            "The throughput measured between each pair of samples.",
+            RATE_BUCKETS, ("stream", "iface"))
+        self.lock = threading.Lock()
+
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            try:
+                self.collect()
+            except Exception as e:
+                sys.stderr.write(f"Sampling failed: {e!r}\n")
+            elapsed = time.monotonic() - started
+            self.stopping.wait(max(0, self.interval - elapsed))
+
+    def reconnected(self):
+        with self.lock:
+            self.counters.reconnected()
+
+    def collect(self):
+        interfaces = self.sample()
+        now = time.monotonic()
+
+        with self.lock:
+            if interfaces is None:
+                # Don't work out a rate across the time the router was
+                # unavailable.
+                self.previous = {}
+                return
+
+            self.counters.update_interfaces(interfaces)
+            current = {}
+            for iface in interfaces:
+                for stream in ("rx", "tx"):
+                    value = getattr(iface, f"{stream}_bytes")
+                    if value is None:
+                        continue
+                    key = (stream, iface.name)
+                    current[key] = (now, value)
+                    if key not in self.previous:
+                        continue
+
+                    then, last_value = self.previous[key]
+                    elapsed = now - then
+                    if elapsed <= 0:
+                        continue
+                    delta = value - last_value
+                    self.rates.setdefault(key, deque()) \
+                        .append((now, elapsed, delta))
+                    self.histogram.observe(delta / elapsed, stream,
+                                           escape_label(iface.name))
+            self.previous = current
+
+            for key in list(self.rates):
+                rates = self.rates[key]
+                while rates and rates[0][0] < now - self.window:
+                    rates.popleft()
+                if key not in current or not rates:
+                    del self.rates[key]
+
+    def families(self):
+        minimums = []
+        maximums = []
+        averages = []
+        with self.lock:
+            for (stream, name), rates in sorted(self.rates.items()):
+                labels = iface_labels(stream, name)
+                values = [delta / elapsed for (_, elapsed, delta) in rates]
+                minimums.append((labels, min(values)))
+                maximums.append((labels, max(values)))
+                averages.append((labels,
+                                 sum(delta for (_, _, delta) in rates)
+                                 / sum(elapsed for (_, elapsed, _) in rates)))
+
+        return [
+            ("zyxel_throughput_min_bytes_per_second", "gauge",
+             "The lowest throughput between two samples in the last "
+             + f"{self.window:g} seconds.", minimums),
+            ("zyxel_throughput_max_bytes_per_second", "gauge",
+             "The highest throughput between two samples in the last "
+             + f"{self.window:g} seconds.", maximums),
+            ("zyxel_throughput_avg_bytes_per_second", "gauge",
+             f"The average throughput over the last {self.window:g} "
+             + "seconds.", averages),
+            self.histogram.family(),
+        ]
+
+    def close(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
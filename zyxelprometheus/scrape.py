@@ -14,39 +14,139 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+
 import time
 
+from .instrumentation import CHANNEL_OPEN_SECONDS, COMMAND_SECONDS, TIMEOUTS
+from .parse import is_net_dev
+
 PROMPT = "ZySH> "
 
+TIMEOUT = 5
+CHUNK_SIZE = 4096
+POLL_INTERVAL = 0.01
+
+
+class ChannelReader:
+    def __init__(self, channel, timeout=TIMEOUT):
+        self.channel = channel
+        self.timeout = timeout
+        self.buffer = bytearray()
+
+    def read_to(self, readto):
+        delimiter = readto.encode("utf8")
+        endtime = time.time() + self.timeout
+        start = 0
+        # Partial output would look like a successful scrape with
+        # interfaces missing, so if the delimiter never arrives the command
+        # fails instead.
+        while True:
+            index = self.buffer.find(delimiter, start)
+            if index != -1:
+                data = bytes(self.buffer[:index])
+                del self.buffer[:index + len(delimiter)]
+                return data.decode("utf8", errors="replace")
+
+            # Only the tail of the buffer can contain the start of a
+            # delimiter that is completed by the next chunk.
+            start = max(0, len(self.buffer) - len(delimiter) + 1)
 
-def _read_to(stdout, readto):
-    endtime = time.time() + 5
-    chars = []
-    lreadto = list(readto)
-    while not stdout.channel.eof_received:
-        char = stdout.read(1).decode("utf8")
-        if char != "":
-            chars.append(char)
-            if chars[-len(readto):] == lreadto:
-                return "".join(chars[:-len(readto)])
-        if time.time() > endtime:
-            stdout.channel.close()
-            break
-    return "".join(chars)
-
-
-def execute(cmd, stdin, stdout):
-    _read_to(stdout, PROMPT)
+            if self.channel.recv_ready():
+                self.buffer += self.channel.recv(CHUNK_SIZE)
+            elif self.channel.eof_received or self.channel.closed:
+                self.channel.close()
+                raise EOFError("The router closed the channel before the "
+                               + "command finished.")
+            elif time.time() > endtime:
+                TIMEOUTS.inc()
+                self.channel.close()
+                raise TimeoutError(f"No response from the router within "
+                                   + f"{self.timeout} seconds.")
+            else:
+                time.sleep(POLL_INTERVAL)
+
+
+def execute(cmd, stdin, stdout, timeout=TIMEOUT):
+    reader = ChannelReader(stdout.channel, timeout)
+    reader.read_to(PROMPT)
     stdin.write(cmd + "\n")
-    _read_to(stdout, cmd + "\r\n")
-    return _read_to(stdout, PROMPT)
+    reader.read_to(cmd + "\r\n")
+    return reader.read_to(PROMPT)
+
+
+class Shell:
+    def __init__(self, session, timeout=TIMEOUT):
+        self.session = session
+        self.timeout = timeout
+        self.stdin = None
+        self.reader = None
+
+    def is_open(self):
+        if self.reader is None:
+            return False
+        channel = self.reader.channel
+        return not (channel.closed or channel.eof_received)
+
+    def open(self):
+        self.close()
+        with CHANNEL_OPEN_SECONDS.time():
+            stdin, stdout, stderr = self.session.exec_command("",
+                                                              get_pty=True)
+            self.stdin = stdin
+            self.reader = ChannelReader(stdout.channel, self.timeout)
+            self.reader.read_to(PROMPT)
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.channel.close()
+        self.stdin = None
+        self.reader = None
+
+    def execute(self, cmd):
+        if not self.is_open():
+            self.open()
+
+        try:
+            self.stdin.write(cmd + "\n")
+        except OSError:
+            # The channel died while it was idle, so open a new one.
+            self.open()
+            self.stdin.write(cmd + "\n")
+
+        with COMMAND_SECONDS.time(cmd):
+            self.reader.read_to(cmd + "\r\n")
+            return self.reader.read_to(PROMPT)
+
+
+def _execute(session, cmd, timeout):
+    if isinstance(session, Shell):
+        return session.execute(cmd)
+
+    shell = Shell(session, timeout)
+    try:
+        return shell.execute(cmd)
+    finally:
+        shell.close()
+
+
+def scrape_xdsl(session, timeout=TIMEOUT, stats=False):
+    cmd = "xdslctl info --stats" if stats else "xdslctl info"
+    return _execute(session, cmd, timeout)
+
+
+def scrape_ifconfig(session, timeout=TIMEOUT):
+    return _execute(session, "ifconfig", timeout)
 
 
-def scrape_xdsl(session):
-    stdin, stdout, stderr = session.exec_command("", get_pty=True)
-    return execute("xdslctl info", stdin, stdout)
+def scrape_net_dev(session, timeout=TIMEOUT):
+    return _execute(session, "cat /proc/net/dev", timeout)
 
 
-def scrape_ifconfig(session):
-    stdin, stdout, stderr = session.exec_command("", get_pty=True)
-    return execute("ifconfig", stdin, stdout)
+def scrape_interfaces(session, timeout=TIMEOUT, net_dev=True):
+    # /proc/net/dev is much smaller and quicker to parse than ifconfig, but
+    # not every router's shell lets us read it.
+    if net_dev:
+        output = scrape_net_dev(session, timeout)
+        if is_net_dev(output):
+            return output
+    return scrape_ifconfig(session, timeout)
@@ -14,41 +14,487 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from datetime import datetime
+import gzip
 import http.server
+import random
+import signal
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+import zlib
 
-from .login import login, logout
-from .prometheus import prometheus
-from .scrape import scrape_ifconfig, scrape_xdsl
+from .counters import CounterTracker
+from .exceptions import RouterUnavailable, StaleMetrics
+from .instrumentation import exporter_families, PARSE_SECONDS, \
+    RECONNECTS, RENDER_SECONDS
+from .login import login, login_options, logout
+from .model import RouterStats
+from .parse import is_net_dev, parse_interfaces, parse_stats
+from .prometheus import format_families, metric_families, \
+    OPENMETRICS_CONTENT_TYPE, TEXT_CONTENT_TYPE
+from .sampler import Sampler
+from .scrape import scrape_ifconfig, scrape_net_dev, scrape_xdsl, Shell
+from .spool import backfill_chunks, Spool, spool_filename
+
+BACKOFF_INITIAL = 1
+BACKOFF_MAX = 300
+
+# The most spooled scrapes returned by one /backfill request.
+BACKFILL_LIMIT = 1000
+
+COMPRESSORS = {
+    "gzip": lambda body: gzip.compress(body, compresslevel=6),
+    "deflate": zlib.compress,
+}
+
+STREAM_COMPRESSORS = {
+    # wbits of 31 writes a gzip header and trailer.
+    "gzip": lambda: zlib.compressobj(6, zlib.DEFLATED, 31),
+    "deflate": zlib.compressobj,
+}
+
+
+def _qualities(header):
+    for item in (header or "").split(","):
+        value, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, param_value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(param_value)
+                except ValueError:
+                    quality = 0
+        yield value.strip().lower(), quality
+
+
+def accepts_openmetrics(accept):
+    best_openmetrics = 0
+    best_text = 0
+    for media_type, quality in _qualities(accept):
+        if media_type == "application/openmetrics-text":
+            best_openmetrics = max(best_openmetrics, quality)
+        elif media_type in ("text/plain", "text/*", "*/*"):
+            best_text = max(best_text, quality)
+
+    return best_openmetrics > 0 and best_openmetrics >= best_text
+
+
+def choose_encoding(accept_encoding):
+    qualities = {}
+    for encoding, quality in _qualities(accept_encoding):
+        qualities[encoding] = quality
+
+    best = None
+    best_quality = 0
+    for encoding in COMPRESSORS:
+        quality = qualities.get(encoding, qualities.get("*", 0))
+        if quality > best_quality:
+            best = encoding
+            best_quality = quality
+    return best
+
+
+class Payload:
+    def __init__(self, families):
+        self.families = families
+        self.bodies = {}
+
+    def body(self, openmetrics=False, encoding=None):
+        # Each format and encoding is only rendered and compressed once,
+        # however many times the payload is requested.
+        key = (openmetrics, encoding)
+        if key not in self.bodies:
+            if encoding is None:
+                with RENDER_SECONDS.time():
+                    body = format_families(self.families, openmetrics) \
+                        .encode("utf8")
+            else:
+                body = COMPRESSORS[encoding](self.body(openmetrics))
+            self.bodies[key] = body
+        return self.bodies[key]
 
 
 class Scraper:
-    def __init__(self, args):
+    def __init__(self, args, host=None, instrumentation=True):
         self.args = args
+        self.host = host if host is not None else args.host
+        self.instrumentation = instrumentation
         self.session = None
+        self.xdsl_shell = None
+        self.iface_shell = None
+        self.executor = None
+        self.logged_in = False
+        self.failures = 0
+        self.next_attempt = 0
+        self.lock = threading.Lock()
+
+        self.flight = None
+        self.flight_lock = threading.Lock()
+        self.coalesced = 0
+
+        self.counters = CounterTracker()
+        self.net_dev = not args.use_ifconfig
+        self.sampler = None
 
     def scrape(self):
-        if self.session is None:
-            self.session = login(self.args.host,
-                                 self.args.user,
-                                 self.args.passwd)
+        # If a scrape is already running, wait for its result rather than
+        # sending the same commands to the router again.
+        with self.flight_lock:
+            flight = self.flight
+            if flight is None:
+                flight = self.flight = Future()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if leader:
+            try:
+                flight.set_result(self._scrape())
+            except Exception as e:
+                flight.set_exception(e)
+            finally:
+                with self.flight_lock:
+                    self.flight = None
+
+        return flight.result()
+
+    def _scrape(self):
+        commands = {}
+        if not self.args.ifconfig_only:
+            commands["xdsl"] = self._scrape_xdsl
+        if not self.args.xdsl_only:
+            commands["ifconfig"] = self._scrape_interfaces
+        outputs = self._run(commands)
+        if outputs is None:
+            return RouterStats(up=False)
+
+        with PARSE_SECONDS.time():
+            stats = parse_stats(outputs.get("xdsl"), outputs.get("ifconfig"),
+                                self.args.iface_include,
+                                self.args.iface_exclude)
+
+        # Only the single scrape in flight gets here, so the previous
+        # values can't be updated concurrently.
+        if stats.interfaces is not None:
+            self.counters.update_interfaces(stats.interfaces)
+        return stats
+
+    def _run(self, commands):
+        # --scrape-timeout covers waiting for the sampler to finish with
+        # the session, logging in and running the commands.
+        deadline = time.monotonic() + self.args.scrape_timeout
+        if not self.lock.acquire(timeout=self.args.scrape_timeout):
+            sys.stderr.write(f"Scrape of {self.host} failed: the session "
+                             + "was busy until the deadline\n")
+            return None
+        try:
+            self._connect(deadline)
+            outputs = self._run_commands(commands, deadline)
+        except RouterUnavailable:
+            return None
+        except Exception as e:
+            sys.stderr.write(f"Scrape of {self.host} failed: {e!r}\n")
+            # Whether the login failed or the router accepted it but then
+            # didn't answer its commands, it isn't sent a new SSH handshake
+            # on every scrape.
+            self._back_off()
+            self._disconnect()
+            return None
+        finally:
+            self.lock.release()
+
+        self.failures = 0
+        return outputs
+
+    def sample_interfaces(self):
+        # Used by the Sampler, which polls just the interface counters in
+        # between the full scrapes, sharing the session and its channels.
+        outputs = self._run({"ifconfig": self._scrape_interfaces})
+        if outputs is None:
+            return None
+        return parse_interfaces(outputs["ifconfig"], self.args.iface_include,
+                                self.args.iface_exclude)
+
+    def _run_commands(self, commands, deadline):
+        # Each command has its own channel, so they can all run at once and
+        # the scrape takes as long as the slowest rather than the total.
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix=f"scrape-{self.host}")
+        futures = {name: self.executor.submit(command)
+                   for (name, command) in commands.items()}
+
+        _, not_done = wait(futures.values(),
+                           timeout=max(0, deadline - time.monotonic()))
+        if not_done:
+            # The caller disconnects, which closes the channels and stops
+            # the commands that are still running.
+            raise TimeoutError(f"Scrape of {self.host} took longer than "
+                               + f"{self.args.scrape_timeout} seconds.")
+        return {name: future.result() for (name, future) in futures.items()}
+
+    def _scrape_xdsl(self):
+        return scrape_xdsl(self.xdsl_shell, stats=self.args.xdsl_stats)
+
+    def _scrape_interfaces(self):
+        shell = self.iface_shell
+        if self.net_dev:
+            output = scrape_net_dev(shell)
+            if is_net_dev(output):
+                return output
+            # Only stop trying if the router answered with something else,
+            # like an error from cat. Empty output doesn't show that it
+            # can't work.
+            if output.strip() != "":
+                self.net_dev = False
+        return scrape_ifconfig(shell)
+
+    def _connect(self, deadline):
+        if self.session is not None:
+            transport = self.session.get_transport()
+            if transport is not None and transport.is_active():
+                return
+            # The router has dropped the connection, e.g. it rebooted.
+            self._disconnect()
+
+        now = time.monotonic()
+        if now < self.next_attempt:
+            raise RouterUnavailable(
+                f"Not reconnecting to {self.host} for another "
+                + f"{self.next_attempt - now:.0f} seconds.")
+
+        # The TCP connection, banner and authentication each have their own
+        # timeout, so share what's left of the deadline between them.
+        remaining = deadline - now
+        if remaining <= 0:
+            raise TimeoutError(f"No time left to log in to {self.host}.")
+        options = login_options(self.args)
+        options["timeout"] = min(self.args.timeout, remaining / 3)
+        self.session = login(self.host,
+                             self.args.user,
+                             self.args.passwd,
+                             **options)
+
+        if self.logged_in:
+            RECONNECTS.inc()
+            self.counters.reconnected()
+            if self.sampler is not None:
+                self.sampler.reconnected()
+        self.xdsl_shell = Shell(self.session, self.args.timeout)
+        self.iface_shell = Shell(self.session, self.args.timeout)
+        self.logged_in = True
+
+    def _back_off(self):
+        # Back off exponentially, with jitter so that many targets don't
+        # all retry at the same moment.
+        self.failures += 1
+        delay = min(BACKOFF_MAX, BACKOFF_INITIAL * 2 ** (self.failures - 1))
+        self.next_attempt = time.monotonic() + delay * random.uniform(0.5, 1)
+
+    def _disconnect(self):
+        if self.session is not None:
+            self.xdsl_shell.close()
+            self.iface_shell.close()
+            logout(self.session)
+        self.session = None
+        self.xdsl_shell = None
+        self.iface_shell = None
+
+    def close(self):
+        with self.lock:
+            self._disconnect()
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+
+    def families(self):
+        families = metric_families(self.scrape()) + self.exporter_metrics()
+        if self.sampler is not None:
+            families += self.sampler.families()
+        if self.instrumentation:
+            families += exporter_families()
+        return families
+
+    def payload(self):
+        return Payload(self.families())
+
+    def exporter_metrics(self):
+        return [
+            ("zyxel_exporter_coalesced_scrapes_total", "counter",
+             "Scrape requests that waited for a scrape that was already "
+             + "running.",
+             [("", self.coalesced)]),
+            ("zyxel_exporter_counter_wraps_total", "counter",
+             "Interface counters that wrapped around at 2^32.",
+             [("", self.counters.wraps)]),
+            ("zyxel_exporter_counter_resets_total", "counter",
+             "Interface counters that went back to zero.",
+             [("", self.counters.resets)]),
+        ]
 
-        xdsl = scrape_xdsl(self.session) \
-            if not self.args.ifconfig_only else None
-        ifconfig = scrape_ifconfig(self.session) \
-            if not self.args.xdsl_only else None
 
-        return xdsl, ifconfig
+class ScheduledScraper:
+    def __init__(self, scraper, interval, max_staleness, spool=None):
+        self.scraper = scraper
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self.spool = spool
+
+        self.latest = None
+        self.scraped_at = None
+        self.lock = threading.Lock()
+
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            self.collect()
+            elapsed = time.monotonic() - started
+            self.stopping.wait(max(0, self.interval - elapsed))
+
+    def collect(self):
+        try:
+            families = self.scraper.families()
+        except Exception as e:
+            sys.stderr.write(f"Scrape of {self.scraper.host} failed: "
+                             + f"{e!r}\n")
+            return
+
+        now = time.time()
+        families.append(
+            ("zyxel_exporter_last_scrape_timestamp_seconds", "gauge",
+             "When the router was last scraped.", [("", now)]))
+
+        if self.spool is not None:
+            self.spool.append(now, families)
+
+        with self.lock:
+            self.latest = Payload(families)
+            self.scraped_at = time.monotonic()
+
+    def payload(self):
+        with self.lock:
+            payload = self.latest
+            scraped_at = self.scraped_at
+
+        if payload is None:
+            raise StaleMetrics("The router hasn't been scraped yet.")
+        age = time.monotonic() - scraped_at
+        if age > self.max_staleness:
+            raise StaleMetrics(f"The last scrape was {age:.0f} seconds ago.")
+
+        return payload
+
+    def close(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.scraper.close()
+        if self.spool is not None:
+            self.spool.close()
+
+
+class ScraperPool:
+    def __init__(self, args, size):
+        self.args = args
+        self.size = size
+        self.targets = frozenset(args.targets)
+        self.scrapers = OrderedDict()
+        self.leases = {}
+        self.retired = set()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, host):
+        scraper = self.acquire(host)
+        try:
+            yield scraper
+        finally:
+            self.release(scraper)
+
+    def acquire(self, host):
+        key = (host, self.args.user)
+        evicted = []
+        with self.lock:
+            scraper = self.scrapers.get(key)
+            if scraper is not None:
+                self.scrapers.move_to_end(key)
+            else:
+                # The exporter's own metrics are only included in /metrics.
+                scraper = Scraper(self.args, host, instrumentation=False)
+                self.scrapers[key] = scraper
+            self.leases[scraper] = self.leases.get(scraper, 0) + 1
+
+            while len(self.scrapers) > self.size:
+                old_scraper = self.scrapers.popitem(last=False)[1]
+                if old_scraper in self.leases:
+                    # Another request is still using it, so it's closed
+                    # when that request has finished.
+                    self.retired.add(old_scraper)
+                else:
+                    evicted.append(old_scraper)
+
+        # Log out outside the pool lock so a slow router being evicted
+        # doesn't stop other targets from being looked up.
+        for old_scraper in evicted:
+            old_scraper.close()
+
+        return scraper
+
+    def release(self, scraper):
+        with self.lock:
+            self.leases[scraper] -= 1
+            if self.leases[scraper] > 0:
+                return
+            del self.leases[scraper]
+            if scraper not in self.retired:
+                return
+            self.retired.remove(scraper)
+
+        scraper.close()
+
+    def close(self):
+        idle = []
+        with self.lock:
+            for scraper in self.scrapers.values():
+                if scraper in self.leases:
+                    self.retired.add(scraper)
+                else:
+                    idle.append(scraper)
+            self.scrapers.clear()
+
+        for scraper in idle:
+            scraper.close()
 
 
 class Handler(http.server.BaseHTTPRequestHandler):
     scraper = None
+    pool = None
+    spool = None
 
     def do_GET(self):
-        if self.path == "/":
+        url = urlsplit(self.path)
+        if url.path == "/":
             self.send_index()
-        elif self.path == "/metrics":
+        elif url.path == "/metrics":
             self.send_metrics()
+        elif url.path == "/probe":
+            self.send_probe(parse_qs(url.query))
+        elif url.path == "/backfill" and self.spool is not None:
+            self.send_backfill(parse_qs(url.query))
         else:
             self.send_error(404)
 
@@ -61,18 +507,129 @@ class Handler(http.server.BaseHTTPRequestHandler):
 <body>
 <h1>Zyxel Prometheus</h1>
 <p><a href="/metrics">Metrics</a></p>
+<p>Other routers can be scraped with /probe?target=host</p>
 </body>
 </html>""".encode("utf8"))
 
     def send_metrics(self):
-        xdsl, ifconfig = self.scraper.scrape()
+        self.send_scrape(self.scraper)
+
+    def send_probe(self, query):
+        if "target" not in query:
+            self.send_error(400, "Missing target parameter")
+            return
 
+        # Only configured routers can be probed, otherwise anyone who can
+        # reach the exporter could have it send the router password to a
+        # host of their choosing.
+        target = query["target"][0]
+        if target not in self.pool.targets:
+            self.send_error(403, "Target not in --targets")
+            return
+
+        with self.pool.lease(target) as scraper:
+            self.send_scrape(scraper)
+
+    def send_backfill(self, query):
+        try:
+            since = float(query["since"][0]) if "since" in query else None
+            limit = int(query["limit"][0]) if "limit" in query \
+                else BACKFILL_LIMIT
+        except ValueError:
+            self.send_error(400, "Invalid since or limit parameter")
+            return
+        if not 0 < limit <= BACKFILL_LIMIT:
+            self.send_error(400, "The limit must be between 1 and "
+                            + f"{BACKFILL_LIMIT}")
+            return
+
+        entries = self.spool.index(since)
+        more = len(entries) > limit
+        entries = entries[:limit]
+
+        encoding = choose_encoding(self.headers.get("Accept-Encoding"))
         self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE)
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        if more:
+            # The oldest records are sent first, so the rest can be
+            # fetched by asking for the records since the last one sent.
+            self.send_header("X-Backfill-Next-Since", f"{entries[-1][1]:.3f}")
         self.end_headers()
-        self.wfile.write(prometheus(xdsl, ifconfig).encode("utf8"))
+
+        # The response is written a family at a time without a
+        # Content-Length, so the whole of it is never held in memory.
+        compressor = STREAM_COMPRESSORS[encoding]() \
+            if encoding is not None else None
+        for chunk in backfill_chunks(lambda: self.spool.read_all(entries),
+                                     len(entries)):
+            data = chunk.encode("utf8")
+            if compressor is not None:
+                data = compressor.compress(data)
+            self.wfile.write(data)
+        if compressor is not None:
+            self.wfile.write(compressor.flush())
+
+    def send_scrape(self, scraper):
+        openmetrics = accepts_openmetrics(self.headers.get("Accept"))
+        encoding = choose_encoding(self.headers.get("Accept-Encoding"))
+        try:
+            payload = scraper.payload()
+        except StaleMetrics as e:
+            self.send_error(503, e.args[0])
+            return
+
+        body = payload.body(openmetrics, encoding)
+
+        self.send_response(200)
+        self.send_header("Content-Type",
+                         OPENMETRICS_CONTENT_TYPE if openmetrics
+                         else TEXT_CONTENT_TYPE)
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept, Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
 
 def serve(args):  # pragma: no cover
-    Handler.scraper = Scraper(args)
-    server = http.server.HTTPServer(args.bind, Handler)
-    server.serve_forever()
+    scraper = Scraper(args)
+    sampler = None
+    if args.sample_interval is not None:
+        sampler = Sampler(scraper.sample_interfaces, args.sample_interval,
+                          args.sample_window)
+        scraper.sampler = sampler
+        sampler.start()
+
+    if args.spool_dir is not None:
+        Handler.spool = Spool(spool_filename(args.spool_dir, args.host),
+                              int(args.spool_size * 1024 * 1024))
+    if args.scrape_interval is not None:
+        Handler.scraper = ScheduledScraper(scraper,
+                                           args.scrape_interval,
+                                           args.max_staleness,
+                                           Handler.spool)
+        Handler.scraper.start()
+    else:
+        Handler.scraper = scraper
+    Handler.pool = ScraperPool(args, args.max_sessions)
+    server = http.server.ThreadingHTTPServer(args.bind, Handler)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it can't be
+        # called from a signal handler running on the serving thread.
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if sampler is not None:
+            sampler.close()
+        Handler.scraper.close()
+        Handler.pool.close()
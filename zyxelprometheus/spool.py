@@ -0,0 +1,239 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+
+from .prometheus import format_timestamp, RENDERER
+
+MAGIC = b"ZYXSPOOL"
+VERSION = 1
+# Records are about 2 kB compressed, and span as many slots as they need,
+# so small slots waste little space on padding.
+SLOT_SIZE = 512
+
+# Roughly the most samples held in memory while writing a backfill.
+BACKFILL_SAMPLES = 100000
+
+# magic, version, slot size, slot count, next sequence number, next slot
+FILE_HEADER = struct.Struct("<8sIIIQI")
+# sequence number, timestamp, record length, crc32, part number
+SLOT_HEADER = struct.Struct("<QdIIH")
+
+# The le label is always the last one on a histogram's _bucket samples.
+le_label_re = re.compile(r',?le="[^"]*"}$')
+
+
+def spool_filename(directory, host):
+    return os.path.join(directory, re.sub(r"[^\w.-]", "_", host) + ".spool")
+
+
+class Spool:
+    def __init__(self, filename, size, slot_size=SLOT_SIZE):
+        self.filename = filename
+        self.slot_size = slot_size
+        self.slot_count = max(1, (size - FILE_HEADER.size) // slot_size)
+        self.lock = threading.Lock()
+
+        length = FILE_HEADER.size + self.slot_count * slot_size
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != length:
+                os.ftruncate(fd, length)
+            self.mmap = mmap.mmap(fd, length)
+        finally:
+            os.close(fd)
+
+        magic, version, slot_size, slot_count, self.sequence, self.slot = \
+            FILE_HEADER.unpack_from(self.mmap, 0)
+        if (magic, version, slot_size, slot_count) \
+                != (MAGIC, VERSION, self.slot_size, self.slot_count):
+            # A new file, or one written with different settings, so start
+            # again from empty.
+            self.mmap[:] = bytes(length)
+            self.sequence = 1
+            self.slot = 0
+            self._write_header()
+
+    def _write_header(self):
+        FILE_HEADER.pack_into(self.mmap, 0, MAGIC, VERSION, self.slot_size,
+                              self.slot_count, self.sequence, self.slot)
+
+    def _offset(self, slot):
+        return FILE_HEADER.size + slot * self.slot_size
+
+    def append(self, timestamp, families):
+        record = zlib.compress(json.dumps(families, separators=(",", ":"))
+                               .encode("utf8"))
+        part_size = self.slot_size - SLOT_HEADER.size
+        parts = -(-len(record) // part_size)
+        if parts > self.slot_count:
+            sys.stderr.write(f"Not spooling a {len(record)} byte record, "
+                             + f"{self.filename} is too small.\n")
+            return
+
+        with self.lock:
+            # Records are kept in consecutive slots, so start again at the
+            # beginning if there isn't room before the end of the file.
+            slot = self.slot if self.slot + parts <= self.slot_count else 0
+            crc = zlib.crc32(record)
+
+            # The first slot is written last, so a record is only valid
+            # once all of it is in the file.
+            for part in reversed(range(parts)):
+                offset = self._offset(slot + part)
+                data = record[part * part_size:(part + 1) * part_size]
+                self.mmap[offset + SLOT_HEADER.size:
+                          offset + SLOT_HEADER.size + len(data)] = data
+                SLOT_HEADER.pack_into(self.mmap, offset, self.sequence,
+                                      timestamp, len(record), crc, part)
+
+            self.sequence += 1
+            self.slot = (slot + parts) % self.slot_count
+            self._write_header()
+
+    def index(self, since=None):
+        # Only the slot headers are read, so finding the records is cheap
+        # however big the spool is. Each record is checked when it's read.
+        entries = []
+        with self.lock:
+            for slot in range(self.slot_count):
+                sequence, timestamp, length, crc, part = \
+                    SLOT_HEADER.unpack_from(self.mmap, self._offset(slot))
+                if sequence == 0 or part != 0:
+                    continue
+                if since is not None and timestamp <= since:
+                    continue
+                entries.append((sequence, timestamp, slot, length, crc))
+
+        entries.sort()
+        return entries
+
+    def read(self, entry):
+        sequence, timestamp, slot, length, crc = entry
+        part_size = self.slot_size - SLOT_HEADER.size
+        parts = -(-length // part_size)
+        if slot + parts > self.slot_count:
+            return None
+
+        record = bytearray()
+        with self.lock:
+            for part in range(parts):
+                offset = self._offset(slot + part)
+                # Skip records that have been partly overwritten.
+                if SLOT_HEADER.unpack_from(self.mmap, offset)[0] != sequence:
+                    return None
+                start = offset + SLOT_HEADER.size
+                record += self.mmap[start:start + min(
+                    part_size, length - part * part_size)]
+        if zlib.crc32(record) != crc:
+            return None
+        return json.loads(zlib.decompress(record))
+
+    def read_all(self, entries):
+        for entry in entries:
+            families = self.read(entry)
+            if families is not None:
+                yield (entry[1], families)
+
+    def records(self, since=None):
+        return list(self.read_all(self.index(since)))
+
+    def close(self):
+        with self.lock:
+            self.mmap.flush()
+            self.mmap.close()
+
+
+def _series_key(metric_type, labels):
+    # A histogram's _bucket, _sum and _count samples for one point have to
+    # be kept together, so they're grouped by their labels without le.
+    if metric_type != "histogram":
+        return labels
+    labels = le_label_re.sub("}", labels[labels.find("{"):]) \
+        if "{" in labels else ""
+    return "" if labels == "{}" else labels
+
+
+def backfill_chunks(read_records, count, max_samples=BACKFILL_SAMPLES,
+                    openmetrics=True):
+    # OpenMetrics needs all of a family's samples together. Rather than
+    # holding every record in memory, the records are read once for as
+    # many families as fit in max_samples, estimated from the family's size
+    # in the first record it's in, and then again for the rest.
+    # read_records returns a new iterator over the records each time.
+    done = set()
+    while True:
+        families = OrderedDict()
+        skipped = set()
+        estimate = 0
+        labelsets = {}
+        for timestamp, record in read_records():
+            for (metric, metric_type, help, samples) in record:
+                key = (metric, metric_type, help)
+                if key in done or key in skipped:
+                    continue
+                series = families.get(key)
+                if series is None:
+                    size = len(samples) * count
+                    if families and estimate + size > max_samples:
+                        skipped.add(key)
+                        continue
+                    estimate += size
+                    series = families[key] = OrderedDict()
+
+                points = {}
+                for (labels, value) in samples:
+                    # Every record has its own copy of the labels, so
+                    # only keep one of them.
+                    labels = labelsets.setdefault(labels, labels)
+                    series_key = _series_key(metric_type, labels)
+                    point = points.get(series_key)
+                    if point is None:
+                        point = points[series_key] = []
+                        series.setdefault(series_key, []) \
+                            .append((timestamp, point))
+                    point.append((labels, value))
+
+        for (metric, metric_type, help), series in families.items():
+            header, sample_name = RENDERER.header(metric, metric_type, help,
+                                                  openmetrics)
+            output = [header]
+            for points in series.values():
+                for timestamp, samples in points:
+                    timestamp = format_timestamp(timestamp, openmetrics)
+                    for labels, value in samples:
+                        output.append(f"{sample_name}{labels} {value}"
+                                      + f"{timestamp}\n")
+            yield "".join(output)
+            done.add((metric, metric_type, help))
+
+        if not skipped:
+            break
+
+    if openmetrics:
+        yield "# EOF\n"
+
+
+def format_backfill(records):
+    return "".join(backfill_chunks(lambda: iter(records), len(records)))
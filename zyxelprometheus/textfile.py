@@ -0,0 +1,115 @@
+# zyxelprometheus
+# Copyright (C) 2020 Andrew Wilkinson
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from .prometheus import escape_label, format_families
+from .server import Scraper
+
+
+def with_label(families, name, value):
+    label = f"""{name}="{escape_label(value)}\""""
+    labelled = []
+    for (metric, metric_type, help, samples) in families:
+        labelled_samples = []
+        for (labels, sample_value) in samples:
+            # Samples may have a suffix, like _bucket, before their labels.
+            prefix, brace, rest = labels.partition("{")
+            labels = f"{prefix}{{{label},{rest}" if brace \
+                else f"{labels}{{{label}}}"
+            labelled_samples.append((labels, sample_value))
+        labelled.append((metric, metric_type, help, labelled_samples))
+    return labelled
+
+
+def write_atomic(filename, data):
+    # Write to a temporary file in the same directory and then rename it,
+    # so that node_exporter never reads a half written file. The temporary
+    # name doesn't end in .prom, so it's ignored by node_exporter.
+    fd, temp_filename = tempfile.mkstemp(
+        dir=os.path.dirname(filename) or ".", prefix=".zyxel_",
+        suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.chmod(temp_filename, 0o644)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.unlink(temp_filename)
+        raise
+
+
+def textfile_name(directory, host):
+    return os.path.join(directory,
+                        "zyxel_" + re.sub(r"[^\w.-]", "_", host) + ".prom")
+
+
+class TextfileWriter:
+    def __init__(self, args):
+        self.directory = args.textfile_dir
+        self.scrapers = [Scraper(args, host, instrumentation=False)
+                         for host in args.targets]
+        self.executor = ThreadPoolExecutor(
+            max_workers=min(len(self.scrapers), 8))
+
+    def write(self):
+        # Scrape the routers at the same time so that a slow one doesn't
+        # hold up the rest.
+        list(self.executor.map(self.write_target, self.scrapers))
+
+    def write_target(self, scraper):
+        try:
+            families = with_label(scraper.families(), "router",
+                                  scraper.host)
+            write_atomic(textfile_name(self.directory, scraper.host),
+                         format_families(families))
+        except Exception as e:
+            sys.stderr.write(f"Writing metrics for {scraper.host} failed: "
+                             + f"{e!r}\n")
+
+    def close(self):
+        self.executor.shutdown()
+        for scraper in self.scrapers:
+            scraper.close()
+
+
+def write_textfiles(args):  # pragma: no cover
+    writer = TextfileWriter(args)
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        while True:
+            started = time.monotonic()
+            writer.write()
+            if args.scrape_interval is None:
+                break
+            elapsed = time.monotonic() - started
+            if stopping.wait(max(0, args.scrape_interval - elapsed)):
+                break
+    finally:
+        writer.close()